@@ -1,11 +1,17 @@
 import streamlit as st
 import preprocessor
 import helper
-import plotly.express as px
-import plotly.graph_objects as go
+import cache
+import profiling
+from scheduler import PROCESS, THREAD, scheduler
+# Plotly (like the heavy analysis libraries in helper) is imported on first
+# use, in the render functions below, so the page comes up quickly
 
 
+import contextlib
 import io
+import os
+import tracemalloc
 import zipfile
 
 # st.sidebar.title('WhatsApp Chat Analyser')
@@ -46,377 +52,600 @@ st.sidebar.markdown("""
     <h1 style='text-align: center; color: #667eea;'>💬 WhatsApp Chat Analyzer</h1>
     """, unsafe_allow_html=True)
 
-uploaded_file = st.sidebar.file_uploader(
-    "📁 Choose a WhatsApp chat file",
-    type=['txt', 'zip']
-)
+@st.cache_data(show_spinner=False, max_entries=256)
+def analysis(name, upload_key, selected_user, _df, *args):
+    """Memoized helper.<name>(selected_user, df, *args).
 
-if uploaded_file is not None:
+    Keyed by the upload's content hash instead of the frame itself (the
+    leading underscore keeps Streamlit from hashing every row)."""
+    return getattr(helper, name)(selected_user, _df, *args)
 
-    data = None  # this will store chat text
 
-    # ---------- CASE 1: TXT FILE ----------
-    if uploaded_file.name.endswith('.txt'):
-        bytes_data = uploaded_file.getvalue()
-        data = bytes_data.decode('utf-8')
+@st.cache_resource(show_spinner=False)
+def warm_up():
+    """Load the analysis libraries in the background, once per server process."""
+    return scheduler.submit(THREAD, helper.warm_up)
 
-    # ---------- CASE 2: ZIP FILE ----------
-    elif uploaded_file.name.endswith('.zip'):
-        with zipfile.ZipFile(uploaded_file) as z:
-            # find the chat txt file
-            txt_files = [f for f in z.namelist() if f.endswith('.txt')]
 
-            if not txt_files:
-                st.error("❌ No chat .txt file found inside ZIP")
-                st.stop()
-
-            # usually only one chat file exists
-            with z.open(txt_files[0]) as f:
-                data = f.read().decode('utf-8')
-
-    df = preprocessor.preprocess(data)
+@contextlib.contextmanager
+def transcript(uploaded_file):
+    """The chat transcript of an upload as a binary stream.
 
+    A .txt upload is the transcript itself; for a .zip the chat entry is
+    picked by preprocessor.chat_member and decompressed while it is read."""
+    uploaded_file.seek(0)
+    if uploaded_file.name.endswith('.zip'):
+        with zipfile.ZipFile(uploaded_file) as z:
+            with z.open(preprocessor.chat_member(z)) as f:
+                yield f
+    else:
+        yield uploaded_file
+
+
+def wordcloud_image(upload_key, selected_user, df, quality):
+    """Word cloud PNG URI, rendered once per chat, user, stop-word set and quality.
+
+    Counting the words stays on this thread (it reads the shared frame);
+    only the top words are sent to a worker process for the layout."""
+    languages = helper.STOP_WORD_LANGUAGES
+    key = f"{upload_key}:{selected_user}:{'+'.join(languages)}:{quality}"
+    image = cache.render_cache.get(key)
+    if image is None:
+        frequencies = helper.word_frequencies(selected_user, df, languages)
+        with profiling.timed('wordcloud.render', user=selected_user, quality=quality):
+            image = scheduler.call(PROCESS, helper.render_wordcloud,
+                                   dict(frequencies.most_common(helper.WORDCLOUD_MAX_WORDS)), quality)
+        cache.render_cache.put(key, image)
+    return image
+
+
+def stream(sections):
+    """Run the sections' analyses concurrently, rendering each when it finishes.
+
+    `sections` maps a name to (slot, render, kind, fn, *args): fn(*args) runs
+    on the scheduler's `kind` pool and render(result) draws into the slot
+    (a container created beforehand, so the layout order is fixed)."""
+    tasks = {name: task for name, (_, _, *task) in sections.items()}
+    for name, result in scheduler.run(tasks):
+        slot, render = sections[name][:2]
+        # building the figure and serializing it for the browser
+        with slot, profiling.timed('render.' + name):
+            render(result)
+
+
+def show_performance(records):
+    st.caption("Stages computed in this run, slowest first (cached results are not listed; "
+               "a stage includes its sub-stages).")
+    st.dataframe(profiling.summarize(records).dropna(axis=1, how='all'), hide_index=True,
+                 use_container_width=True)
+    rss = profiling.max_rss_mb()
+    if rss is not None:
+        st.caption(f"Peak process memory: {rss:,.0f} MB")
+    if not tracemalloc.is_tracing():
+        st.caption("Set PROFILE_MEMORY=1 to measure the peak memory of every stage.")
+
+
+def show_sentiment_split(sentiment_stats):
+    import plotly.graph_objects as go
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("😊 Positive", f"{sentiment_stats['positive']:.1f}%",
+                  delta=f"{sentiment_stats['positive']:.1f}%", delta_color="normal")
+    with col2:
+        st.metric("😐 Neutral", f"{sentiment_stats['neutral']:.1f}%",
+                  delta=f"{sentiment_stats['neutral']:.1f}%", delta_color="off")
+    with col3:
+        st.metric("❌ Negative", f"{sentiment_stats['negative']:.1f}%",
+                  delta=f"-{sentiment_stats['negative']:.1f}%", delta_color="inverse")
+
+    # Animated Sentiment Pie Chart
+    fig = go.Figure(data=[go.Pie(
+        labels=['Positive 😊', 'Neutral 😐', 'Negative 😞'],
+        values=[sentiment_stats['positive'], sentiment_stats['neutral'], sentiment_stats['negative']],
+        hole=.4,
+        marker=dict(colors=['#10b981', '#fbbf24', '#ef4444'],
+                    line=dict(color='#FFFFFF', width=3)),
+        textfont=dict(size=16, color='white'),
+        hovertemplate='<b>%{label}</b><br>%{value:.1f}%<extra></extra>'
+    )])
+
+    fig.update_layout(
+        title={
+            'text': '🎭 Sentiment Distribution',
+            'x': 0.5,
+            'xanchor': 'center',
+            'font': {'size': 24, 'color': '#667eea'}
+        },
+        showlegend=True,
+        height=500,
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        font=dict(size=14)
+    )
 
+    st.plotly_chart(fig, use_container_width=True)
+
+
+TIMELINE_LABELS = {'D': 'Daily', 'W': 'Weekly', 'M': 'Monthly', 'Q': 'Quarterly', 'Y': 'Yearly'}
+
+# longer series are drawn with WebGL (Scattergl) and without markers
+SCATTERGL_MIN_POINTS = 1000
+
+
+def show_sentiment_timeline(sentiment_timeline):
+    import plotly.graph_objects as go
+
+    dense = len(sentiment_timeline) >= SCATTERGL_MIN_POINTS
+    scatter = go.Scattergl if dense else go.Scatter
+    mode = 'lines' if dense else 'lines+markers'
+
+    fig = go.Figure()
+
+    fig.add_trace(scatter(
+        x=sentiment_timeline['date'], y=sentiment_timeline['positive'],
+        name='Positive', mode=mode,
+        line=dict(color='#10b981', width=3),
+        marker=dict(size=8, symbol='circle'),
+        fill='tonexty', fillcolor='rgba(16, 185, 129, 0.2)'
+    ))
+
+    fig.add_trace(scatter(
+        x=sentiment_timeline['date'], y=sentiment_timeline['neutral'],
+        name='Neutral', mode=mode,
+        line=dict(color='#fbbf24', width=3),
+        marker=dict(size=8, symbol='square'),
+        fill='tonexty', fillcolor='rgba(251, 191, 36, 0.2)'
+    ))
+
+    fig.add_trace(scatter(
+        x=sentiment_timeline['date'], y=sentiment_timeline['negative'],
+        name='Negative', mode=mode,
+        line=dict(color='#ef4444', width=3),
+        marker=dict(size=8, symbol='diamond'),
+        fill='tonexty', fillcolor='rgba(239, 68, 68, 0.2)'
+    ))
+
+    fig.update_layout(
+        title='Sentiment Trends',
+        xaxis_title='Date',
+        yaxis_title='Percentage (%)',
+        hovermode='x unified',
+        height=500,
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(255,255,255,0.9)',
+        font=dict(size=14)
+    )
 
+    st.plotly_chart(fig, use_container_width=True)
+    freq = sentiment_timeline.attrs.get('freq')
+    if freq in TIMELINE_LABELS:
+        st.caption(f"{TIMELINE_LABELS[freq]} resolution, {len(sentiment_timeline):,} points")
 
-    # Extract no.of unique users
 
+def show_wordcloud(wc_image):
+    import plotly.graph_objects as go
 
-    # Extract only the user part before the first colon
-    df['users'] = (
-        df['users']
-        .str.strip()
-        .str.replace(r'\s+' , ' ', regex = True )
-    )
-    # Remove 'group_notification' (case-insensitive)
-    df = df[df['users'] != 'group_notification']
-    user_list = (
-        df['users'].unique().tolist()
+    fig = go.Figure()
+    fig.add_layout_image(
+        dict(source=wc_image,
+             xref="paper", yref="paper",
+             x=0, y=1,
+             sizex=1, sizey=1,
+             sizing="contain",
+             layer="below")
     )
 
-    user_list.sort()
-    user_list.insert(0, 'Overall')
+    fig.update_xaxes(showticklabels=False, showgrid=False, zeroline=False)
+    fig.update_yaxes(showticklabels=False, showgrid=False, zeroline=False)
+    fig.update_layout(height=600,
+                      margin=dict(l=0, r=0, t=0, b=0),
+                      xaxis=dict(visible=False),
+                      yaxis=dict(visible=False)
 
+                      )
 
-    selected_user = st.sidebar.selectbox("👤 Show analysis for", user_list)
+    st.plotly_chart(fig, use_container_width=True)
 
-    if st.sidebar.button("🚀 Show Analysis", use_container_width=True):
 
-        # Header
-        st.markdown("<p class='big-font'>📊 Chat Analytics Dashboard</p>", unsafe_allow_html=True)
-        st.markdown("---")
+def show_common_words(most_common_df):
+    import plotly.express as px
 
-        # Stats Area with animated metrics
-        num_messages, words, num_media_messages, num_links = helper.fetch_statistics(selected_user, df)
+    fig = px.bar(most_common_df, x=1, y=0, orientation='h',
+                 labels={'1': 'Frequency', '0': 'Words'},
+                 title='Top 20 Most Used Words',
+                 color=1,
+                 color_continuous_scale='Blues')
 
-        col1, col2, col3, col4 = st.columns(4)
+    fig.update_layout(showlegend=False, height=600,
+                      paper_bgcolor='rgba(0,0,0,0)',
+                      plot_bgcolor='rgba(173,216,230,0.9)',
 
-        with col1:
-            st.metric("💬 Total Messages", f"{num_messages:,}", delta="Messages")
-        with col2:
-            st.metric("📝 Total Words", f"{words:,}", delta="Words")
-        with col3:
-            st.metric("🎬 Media Shared", f"{num_media_messages:,}", delta="Files")
-        with col4:
-            st.metric("🔗 Links Shared", f"{num_links:,}", delta="URLs")
+                      yaxis={'categoryorder': 'total ascending'})
 
-        st.markdown("---")
+    st.plotly_chart(fig, use_container_width=True)
 
-        # Sentiment Analysis Section
-        st.markdown("<h2 style='text-align: center; color: #667eea;'>😊 Emotional Tone of Messages</h2>", unsafe_allow_html=True)
 
-        sentiment_stats = helper.sentiment_analysis(selected_user, df)
+def show_monthly_timeline(timeline):
+    import plotly.express as px
 
-        col1, col2, col3 = st.columns(3)
-        with col1:
-            st.metric("😊 Positive", f"{sentiment_stats['positive']:.1f}%",
-                      delta=f"{sentiment_stats['positive']:.1f}%", delta_color="normal")
-        with col2:
-            st.metric("😐 Neutral", f"{sentiment_stats['neutral']:.1f}%",
-                      delta=f"{sentiment_stats['neutral']:.1f}%", delta_color="off")
-        with col3:
-            st.metric("❌ Negative", f"{sentiment_stats['negative']:.1f}%",
-                      delta=f"-{sentiment_stats['negative']:.1f}%", delta_color="inverse")
-
-        # Animated Sentiment Pie Chart
-        fig = go.Figure(data=[go.Pie(
-            labels=['Positive 😊', 'Neutral 😐', 'Negative 😞'],
-            values=[sentiment_stats['positive'], sentiment_stats['neutral'], sentiment_stats['negative']],
-            hole=.4,
-            marker=dict(colors=['#10b981', '#fbbf24', '#ef4444'],
-                        line=dict(color='#FFFFFF', width=3)),
-            textfont=dict(size=16, color='white'),
-            hovertemplate='<b>%{label}</b><br>%{value:.1f}%<extra></extra>'
-        )])
+    fig = px.line(timeline, x='time', y='message',
+                  title='Messages Over Months',
+                  labels={'time': 'Month-Year', 'message': 'Number of Messages'})
 
-        fig.update_layout(
-            title={
-                'text': '🎭 Sentiment Distribution',
-                'x': 0.5,
-                'xanchor': 'center',
-                'font': {'size': 24, 'color': '#667eea'}
-            },
-            showlegend=True,
-            height=500,
-            paper_bgcolor='rgba(0,0,0,0)',
-            plot_bgcolor='rgba(0,0,0,0)',
-            font=dict(size=14)
-        )
+    fig.update_traces(line_color='#667eea', line_width=3,
+                      mode='lines+markers', marker=dict(size=10))
+    fig.update_layout(height=500, hovermode='x',
+                      paper_bgcolor='rgba(0,0,0,0)',
+                      plot_bgcolor='rgba(255,255,255,0.9)')
 
-        st.plotly_chart(fig, use_container_width=True)
+    st.plotly_chart(fig, use_container_width=True)
 
-        # Sentiment Timeline
-        st.markdown("<h2 style='text-align: center; color: #667eea;'>📈 Chat Mood Over Time</h2>",
-                    unsafe_allow_html=True)
-
-        sentiment_timeline = helper.sentiment_timeline(selected_user, df)
-
-        fig = go.Figure()
-
-        fig.add_trace(go.Scatter(
-            x=sentiment_timeline['date'], y=sentiment_timeline['positive'],
-            name='Positive', mode='lines+markers',
-            line=dict(color='#10b981', width=3),
-            marker=dict(size=8, symbol='circle'),
-            fill='tonexty', fillcolor='rgba(16, 185, 129, 0.2)'
-        ))
-
-        fig.add_trace(go.Scatter(
-            x=sentiment_timeline['date'], y=sentiment_timeline['neutral'],
-            name='Neutral', mode='lines+markers',
-            line=dict(color='#fbbf24', width=3),
-            marker=dict(size=8, symbol='square'),
-            fill='tonexty', fillcolor='rgba(251, 191, 36, 0.2)'
-        ))
-
-        fig.add_trace(go.Scatter(
-            x=sentiment_timeline['date'], y=sentiment_timeline['negative'],
-            name='Negative', mode='lines+markers',
-            line=dict(color='#ef4444', width=3),
-            marker=dict(size=8, symbol='diamond'),
-            fill='tonexty', fillcolor='rgba(239, 68, 68, 0.2)'
-        ))
 
-        fig.update_layout(
-            title='Sentiment Trends',
-            xaxis_title='Date',
-            yaxis_title='Percentage (%)',
-            hovermode='x unified',
-            height=500,
-            paper_bgcolor='rgba(0,0,0,0)',
-            plot_bgcolor='rgba(255,255,255,0.9)',
-            font=dict(size=14)
-        )
+def show_busy_day(busy_day):
+    import plotly.express as px
 
-        st.plotly_chart(fig, use_container_width=True)
+    fig = px.bar(x=busy_day.index, y=busy_day.values,
+                 labels={'x': 'Day', 'y': 'Messages'},
+                 color=busy_day.values,
+                 color_continuous_scale='Purples')
 
-        st.markdown("---")
+    fig.update_layout(showlegend=False, height=400,
+                      paper_bgcolor='rgba(17, 24, 39, 1)' ,
+                      plot_bgcolor='rgba(255,255,255,0.9)')
 
+    st.plotly_chart(fig, use_container_width=True)
 
 
-        # WordCloud
-        st.markdown("<h2 style='text-align: center; color: #667eea;'>☁️ Common Chat Words</h2>", unsafe_allow_html=True)
-        df_wc = helper.create_wordcloud(selected_user, df)
+def show_busy_month(busy_month):
+    import plotly.express as px
 
-        fig = go.Figure()
-        fig.add_layout_image(
-            dict(source=df_wc.to_image(),
-                 xref="paper", yref="paper",
-                 x=0, y=1,
-                 sizex=1, sizey=1,
-                 sizing="contain",
-                 layer="below")
-        )
+    fig = px.bar(x=busy_month.index, y=busy_month.values,
+                 labels={'x': 'Month', 'y': 'Messages'},
+                 color=busy_month.values,
+                 color_continuous_scale='Oranges')
 
-        fig.update_xaxes(showticklabels=False, showgrid=False, zeroline=False)
-        fig.update_yaxes(showticklabels=False, showgrid=False, zeroline=False)
-        fig.update_layout(height=600,
-                          margin=dict(l=0, r=0, t=0, b=0),
-                          xaxis=dict(visible=False),
-                          yaxis=dict(visible=False)
+    fig.update_layout(showlegend=False, height=400,
+                      paper_bgcolor='rgba(15, 23, 42, 0.95)',
+                      plot_bgcolor='rgba(255,255,255,0.9)')
 
-                          )
+    st.plotly_chart(fig, use_container_width=True)
 
-        st.plotly_chart(fig, use_container_width=True)
 
+def show_busy_users(busy_users):
+    import plotly.express as px
 
+    x, new_df = busy_users
 
+    col1, col2 = st.columns(2)
+    # Example
 
-        # Monthly Timeline
-        st.markdown("<h2 style='text-align: center; color: #667eea;'>📅 Monthly Activity</h2>", unsafe_allow_html=True)
-        timeline = helper.monthly_timeline(selected_user, df)
 
-        fig = px.line(timeline, x='time', y='message',
-                      title='Messages Over Months',
-                      labels={'time': 'Month-Year', 'message': 'Number of Messages'})
+    # Your gradient colors from left to right (peach → dark purple)
 
-        fig.update_traces(line_color='#667eea', line_width=3,
-                          mode='lines+markers', marker=dict(size=10))
-        fig.update_layout(height=500, hovermode='x',
-                          paper_bgcolor='rgba(0,0,0,0)',
-                          plot_bgcolor='rgba(255,255,255,0.9)')
+    with col1:
+        fig = px.bar(
+            x=x.index,
+            y=x.values,
+            labels={'x': 'User', 'y': 'Messages'},
+            title='Top 5 Active Users',
+            color=x.values,
+            color_continuous_scale=[
+                'rgb(255, 204, 204)',  # light peach
+                 'rgb(255, 153, 204)',  # pink
+                 'rgb(204, 102, 204)',  # medium purple
+                  'rgb(153, 51, 153)',  # dark purple
+                   'rgb(77, 0, 77)'  # darkest purple # still darkish red, avoid pale
+            ]
+        )
 
-        st.plotly_chart(fig, use_container_width=True)
+        fig.update_layout(
+            showlegend=False,
+            height=500,
+            font_color='black',  # avoid white text
+            paper_bgcolor='white',
+            plot_bgcolor='white',
+            xaxis=dict(tickfont=dict(color='rgba(200, 200, 200, 0.95)')),
+            yaxis=dict(tickfont=dict(color='rgba(200, 200, 200, 0.95)'))
+        )
 
+        st.plotly_chart(fig, use_container_width=True)
 
+    with col2:
+        st.subheader("📋 User Statistics")
+        st.dataframe(new_df, use_container_width=True, height=500)
 
-        st.markdown("---")
 
-        # Activity Map
-        st.markdown("<h2 style='text-align: center; color: #667eea;'>⚡ Activity Patterns</h2>", unsafe_allow_html=True)
+def show_emojis(emoji_df):
+    import plotly.express as px
 
+    if not emoji_df.empty:
         col1, col2 = st.columns(2)
 
         with col1:
-            st.subheader("📊 Peak Chat Day")
-            busy_day = helper.week_activity_map(selected_user, df)
+            st.subheader("📊 Top Emojis")
+            st.dataframe(emoji_df.head(10), use_container_width=True, height=400)
 
-            fig = px.bar(x=busy_day.index, y=busy_day.values,
-                         labels={'x': 'Day', 'y': 'Messages'},
-                         color=busy_day.values,
-                         color_continuous_scale='Purples')
+        with col2:
+            fig = px.pie(emoji_df.head(10), values=1, names=0,
+                         title='Top 10 Emoji Distribution',
+                         hole=0.4)
+
+            fig.update_traces(textposition='inside', textinfo='percent+label',
+                              marker=dict(line=dict(color='#FFFFFF', width=2)))
 
-            fig.update_layout(showlegend=False, height=400,
-                              paper_bgcolor='rgba(17, 24, 39, 1)' ,
-                              plot_bgcolor='rgba(255,255,255,0.9)')
+            fig.update_layout(height=400,
+                              paper_bgcolor='rgba(0,0,0,0)',
+                              plot_bgcolor='rgba(255,255,255,0.9)',
+                              showlegend=False)
 
             st.plotly_chart(fig, use_container_width=True)
+    else:
+        st.info("No emojis found in the selected chat!")
 
-        with col2:
-            st.subheader("📊 Most Active Chat Month")
-            busy_month = helper.month_activity_map(selected_user, df)
 
-            fig = px.bar(x=busy_month.index, y=busy_month.values,
-                         labels={'x': 'Month', 'y': 'Messages'},
-                         color=busy_month.values,
-                         color_continuous_scale='Oranges')
+# timings of this run, shown in the Performance panel and logged as JSON
+records = profiling.collect()
 
-            fig.update_layout(showlegend=False, height=400,
-                              paper_bgcolor='rgba(15, 23, 42, 0.95)',
-                              plot_bgcolor='rgba(255,255,255,0.9)')
+uploaded_file = st.sidebar.file_uploader(
+    "📁 Choose a WhatsApp chat file",
+    type=['txt', 'zip']
+)
 
-            st.plotly_chart(fig, use_container_width=True)
+# while the user picks a file; WARM_UP=0 leaves it to the first analysis.
+# Not when a PROCESS pool worker imports this script as __mp_main__: the
+# fork server must not start threads
+if __name__ == '__main__' and os.environ.get('WARM_UP', '1') != '0':
+    warm_up()
 
-        # Heatmap
-        # st.markdown("<h2 style='text-align: center; color: #667eea;'>🔥 Weekly Activity Heatmap</h2>",
-        #             unsafe_allow_html=True)
-        # user_heatmap = helper.activity_heatmap(selected_user, df)
-        #
-        # fig = go.Figure(data=go.Heatmap(
-        #     z=user_heatmap.values,
-        #     x=user_heatmap.columns,
-        #     y=user_heatmap.index,
-        #     colorscale='Viridis',
-        #     hovertemplate='Day: %{y}<br>Time: %{x}<br>Messages: %{z}<extra></extra>'
-        # ))
-        #
-        # fig.update_layout(
-        #     title='Activity Heatmap (Day vs Time)',
-        #     xaxis_title='Time Period',
-        #     yaxis_title='Day of Week',
-        #     height=500,
-        #     paper_bgcolor='rgba(0,0,0,0)',
-        #     plot_bgcolor='rgba(255,255,255,0.9)'
-        # )
-        #
-        # st.plotly_chart(fig, use_container_width=True)
-        #
-        # st.markdown("---")
-
-        # Most Busy Users (Group level)
-        if selected_user == 'Overall':
-            st.markdown("<h2 style='text-align: center; color: #667eea;'>👥 Most Active Users</h2>",
-                        unsafe_allow_html=True)
-            x, new_df = helper.most_busy_users(df)
-
-            col1, col2 = st.columns(2)
-            # Example
-
-
-            # Your gradient colors from left to right (peach → dark purple)
-
-            with col1:
-                fig = px.bar(
-                    x=x.index,
-                    y=x.values,
-                    labels={'x': 'User', 'y': 'Messages'},
-                    title='Top 5 Active Users',
-                    color=x.values,
-                    color_continuous_scale=[
-                        'rgb(255, 204, 204)',  # light peach
-                         'rgb(255, 153, 204)',  # pink
-                         'rgb(204, 102, 204)',  # medium purple
-                          'rgb(153, 51, 153)',  # dark purple
-                           'rgb(77, 0, 77)'  # darkest purple # still darkish red, avoid pale
-                    ]
-                )
-
-                fig.update_layout(
-                    showlegend=False,
-                    height=500,
-                    font_color='black',  # avoid white text
-                    paper_bgcolor='white',
-                    plot_bgcolor='white',
-                    xaxis=dict(tickfont=dict(color='rgba(200, 200, 200, 0.95)')),
-                    yaxis=dict(tickfont=dict(color='rgba(200, 200, 200, 0.95)'))
-                )
-
-                st.plotly_chart(fig, use_container_width=True)
-
-            with col2:
-                st.subheader("📋 User Statistics")
-                st.dataframe(new_df, use_container_width=True, height=500)
+if uploaded_file is not None:
 
-        st.markdown("---")
+    # hashed once per upload rather than on every rerun (each widget change
+    # and tab switch reruns the script)
+    file_id, upload_key = st.session_state.get('upload_digest', (None, None))
+    if file_id != uploaded_file.file_id:
+        with profiling.timed('upload.hash', bytes=uploaded_file.size):
+            upload_key = cache.content_hash(uploaded_file)
+        st.session_state['upload_digest'] = (uploaded_file.file_id, upload_key)
+
+    # reruns (changing the user, pressing the button again) reuse the parsed
+    # frame as long as the uploaded bytes are the same
+    df = cache.parse_cache.get(upload_key)
+    formats = None   # set when this run analyzed the upload
+
+    if df is None:
+        # a newer export of a chat analyzed before: parse and analyze only the
+        # messages appended since, then merge them into the stored results
+        try:
+            with transcript(uploaded_file) as f:
+                base = cache.export_history.find_base(f)
+                base_df = raw_base = None
+                if base is not None:
+                    base_df = cache.parse_cache.get(base['upload_key'])
+                    # the parsed base also survives restarts on disk; then
+                    # only its analysis is redone
+                    raw_base = cache.disk_cache.get(base['upload_key'])
+                    if base_df is None and raw_base is not None:
+                        base_df = helper.prepare_chat(raw_base, scheduler=scheduler)
+                if base_df is not None:
+                    f.seek(base['size'])
+                    tail = preprocessor.preprocess_tail(f, base['chat_format'], base['date_format'])
+                    # no new messages: the same transcript (e.g. zipped this
+                    # time) or only trailing whitespace
+                    df = helper.extend_chat(base_df, tail, scheduler=scheduler) if len(tail) else base_df
+                    formats = tail.attrs
+                    if raw_base is not None:
+                        # so the next export can build on this one after a restart
+                        cache.disk_cache.put(upload_key, preprocessor.append_messages(raw_base, tail))
+        except (ValueError, zipfile.BadZipFile):
+            # not a clean continuation; analyze the export from scratch
+            df = None
+
+    if df is None:
+        # parsed before (possibly by an earlier server process)?
+        raw = cache.disk_cache.get(upload_key)
+
+        if raw is None:
+            try:
+                # the upload (a .txt, or the chat entry of a .zip; attached
+                # media is never read) is decompressed and decoded as it is parsed
+                with transcript(uploaded_file) as f:
+                    raw = preprocessor.preprocess(f)
+            except (ValueError, zipfile.BadZipFile) as e:
+                st.error(f"❌ Could not read this chat export: {e}")
+                st.stop()
+
+            cache.disk_cache.put(upload_key, raw)
 
+        # user names are already stripped / whitespace-normalized by preprocess;
+        # group notifications are dropped, then features, user index and
+        # per-user aggregates are built once and shared by every analysis below
+        df = helper.prepare_chat(raw, scheduler=scheduler)
+        formats = raw.attrs
 
-        # Most Common Words
-        st.markdown("<h2 style='text-align: center; color: #667eea;'>🔤 Most Common Words</h2>", unsafe_allow_html=True)
-        most_common_df = helper.most_common_words(selected_user, df)
+    if formats is not None:
+        cache.parse_cache.put(upload_key, df)
+        # remembered so the next export of this chat is analyzed incrementally
+        if formats.get('chat_format'):
+            with transcript(uploaded_file) as f:
+                cache.export_history.record(f, upload_key, formats['chat_format'], formats['date_format'])
 
-        fig = px.bar(most_common_df, x=1, y=0, orientation='h',
-                     labels={'1': 'Frequency', '0': 'Words'},
-                     title='Top 20 Most Used Words',
-                     color=1,
-                     color_continuous_scale='Blues')
+    stats = cache.parse_cache.stats()
+    st.sidebar.caption(f"🗄️ Parse cache: {stats['hits']} hits · {stats['misses']} misses · "
+                       f"{stats['entries']} chats ({stats['bytes'] / 1e6:.1f} MB)")
 
-        fig.update_layout(showlegend=False, height=600,
-                          paper_bgcolor='rgba(0,0,0,0)',
-                          plot_bgcolor='rgba(173,216,230,0.9)',
+    user_list = (
+        df['users'].cat.categories.tolist()
+    )
 
-                          yaxis={'categoryorder': 'total ascending'})
+    user_list.sort()
+    user_list.insert(0, 'Overall')
 
-        st.plotly_chart(fig, use_container_width=True)
 
-        st.markdown("---")
+    selected_user = st.sidebar.selectbox("👤 Show analysis for", user_list)
+    # 'auto' picks the resolution from the chat's date span, at most
+    # helper.TIMELINE_MAX_POINTS points per trace
+    timeline_freq = st.sidebar.selectbox(
+        "📈 Mood timeline resolution",
+        ['auto', 'D', 'W', 'M'],
+        format_func={'auto': 'Automatic', **TIMELINE_LABELS}.get
+    )
+    wordcloud_quality = st.sidebar.radio(
+        "☁️ Word cloud quality",
+        list(helper.WORDCLOUD_QUALITY),
+        index=list(helper.WORDCLOUD_QUALITY).index(os.environ.get('WORDCLOUD_QUALITY', 'preview')),
+        format_func=str.capitalize,
+        horizontal=True
+    )
+    show_perf = st.sidebar.toggle(
+        "⏱️ Performance panel",
+        value=os.environ.get('PERFORMANCE_PANEL', '').lower() in ('1', 'true', 'yes')
+    )
 
-        # Emoji Analysis
-        st.markdown("<h2 style='text-align: center; color: #667eea;'>😀 Emoji Analysis</h2>", unsafe_allow_html=True)
-        emoji_df = helper.emoji_helper(selected_user, df)
+    if st.sidebar.button("🚀 Show Analysis", use_container_width=True):
+        st.session_state['analysis_for'] = upload_key
 
-        if not emoji_df.empty:
-            col1, col2 = st.columns(2)
+    # switching tabs reruns the script; remember that the analysis of this
+    # upload was requested so the dashboard stays open
+    if st.session_state.get('analysis_for') == upload_key:
 
-            with col1:
-                st.subheader("📊 Top Emojis")
-                st.dataframe(emoji_df.head(10), use_container_width=True, height=400)
+        # Header
+        st.markdown("<p class='big-font'>📊 Chat Analytics Dashboard</p>", unsafe_allow_html=True)
+        st.markdown("---")
 
-            with col2:
-                fig = px.pie(emoji_df.head(10), values=1, names=0,
-                             title='Top 10 Emoji Distribution',
-                             hole=0.4)
+        # Stats Area with animated metrics
+        num_messages, words, num_media_messages, num_links = helper.fetch_statistics(selected_user, df)
 
-                fig.update_traces(textposition='inside', textinfo='percent+label',
-                                  marker=dict(line=dict(color='#FFFFFF', width=2)))
+        col1, col2, col3, col4 = st.columns(4)
 
-                fig.update_layout(height=400,
-                                  paper_bgcolor='rgba(0,0,0,0)',
-                                  plot_bgcolor='rgba(255,255,255,0.9)',
-                                  showlegend=False)
+        with col1:
+            st.metric("💬 Total Messages", f"{num_messages:,}", delta="Messages")
+        with col2:
+            st.metric("📝 Total Words", f"{words:,}", delta="Words")
+        with col3:
+            st.metric("🎬 Media Shared", f"{num_media_messages:,}", delta="Files")
+        with col4:
+            st.metric("🔗 Links Shared", f"{num_links:,}", delta="URLs")
+
+        st.markdown("---")
 
-                st.plotly_chart(fig, use_container_width=True)
-        else:
-            st.info("No emojis found in the selected chat!")
+        # only the open tab's analyses run; results are memoized per chat and
+        # each tab's analyses run concurrently, filling their slots as they finish
+        sections = ['😊 Sentiment', '☁️ Words', '📅 Activity', '😀 Emojis']
+        if selected_user == 'Overall':
+            sections.insert(3, '👥 Users')
+        tabs = dict(zip(sections, st.tabs(sections, on_change='rerun', key='section')))
+
+        if tabs['😊 Sentiment'].open:
+            with tabs['😊 Sentiment']:
+                # Sentiment Analysis Section
+                st.markdown("<h2 style='text-align: center; color: #667eea;'>😊 Emotional Tone of Messages</h2>", unsafe_allow_html=True)
+                split_slot = st.container()
+
+                # Sentiment Timeline
+                st.markdown("<h2 style='text-align: center; color: #667eea;'>📈 Chat Mood Over Time</h2>",
+                            unsafe_allow_html=True)
+                timeline_slot = st.container()
+
+                st.markdown("---")
+
+                stream({
+                    'sentiment_analysis': (split_slot, show_sentiment_split, THREAD, analysis,
+                                           'sentiment_analysis', upload_key, selected_user, df),
+                    'sentiment_timeline': (timeline_slot, show_sentiment_timeline, THREAD, analysis,
+                                           'sentiment_timeline', upload_key, selected_user, df, timeline_freq,
+                                           helper.TIMELINE_MAX_POINTS),
+                })
+
+        if tabs['☁️ Words'].open:
+            with tabs['☁️ Words']:
+                # WordCloud
+                st.markdown("<h2 style='text-align: center; color: #667eea;'>☁️ Common Chat Words</h2>", unsafe_allow_html=True)
+                wordcloud_slot = st.container()
+
+                # Most Common Words
+                st.markdown("<h2 style='text-align: center; color: #667eea;'>🔤 Most Common Words</h2>", unsafe_allow_html=True)
+                words_slot = st.container()
+
+                st.markdown("---")
+
+                stream({
+                    'wordcloud': (wordcloud_slot, show_wordcloud, THREAD, wordcloud_image,
+                                  upload_key, selected_user, df, wordcloud_quality),
+                    'most_common_words': (words_slot, show_common_words, THREAD, analysis,
+                                          'most_common_words', upload_key, selected_user, df),
+                })
+
+        if tabs['📅 Activity'].open:
+            with tabs['📅 Activity']:
+                # Monthly Timeline
+                st.markdown("<h2 style='text-align: center; color: #667eea;'>📅 Monthly Activity</h2>", unsafe_allow_html=True)
+                monthly_slot = st.container()
+
+                st.markdown("---")
+
+                # Activity Map
+                st.markdown("<h2 style='text-align: center; color: #667eea;'>⚡ Activity Patterns</h2>", unsafe_allow_html=True)
+
+                col1, col2 = st.columns(2)
+
+                with col1:
+                    st.subheader("📊 Peak Chat Day")
+                with col2:
+                    st.subheader("📊 Most Active Chat Month")
+
+                stream({
+                    'monthly_timeline': (monthly_slot, show_monthly_timeline, THREAD, analysis,
+                                         'monthly_timeline', upload_key, selected_user, df),
+                    'week_activity_map': (col1, show_busy_day, THREAD, analysis,
+                                          'week_activity_map', upload_key, selected_user, df),
+                    'month_activity_map': (col2, show_busy_month, THREAD, analysis,
+                                           'month_activity_map', upload_key, selected_user, df),
+                })
+
+                # Heatmap
+                # st.markdown("<h2 style='text-align: center; color: #667eea;'>🔥 Weekly Activity Heatmap</h2>",
+                #             unsafe_allow_html=True)
+                # user_heatmap = helper.activity_heatmap(selected_user, df)
+                #
+                # fig = go.Figure(data=go.Heatmap(
+                #     z=user_heatmap.values,
+                #     x=user_heatmap.columns,
+                #     y=user_heatmap.index,
+                #     colorscale='Viridis',
+                #     hovertemplate='Day: %{y}<br>Time: %{x}<br>Messages: %{z}<extra></extra>'
+                # ))
+                #
+                # fig.update_layout(
+                #     title='Activity Heatmap (Day vs Time)',
+                #     xaxis_title='Time Period',
+                #     yaxis_title='Day of Week',
+                #     height=500,
+                #     paper_bgcolor='rgba(0,0,0,0)',
+                #     plot_bgcolor='rgba(255,255,255,0.9)'
+                # )
+                #
+                # st.plotly_chart(fig, use_container_width=True)
+                #
+                # st.markdown("---")
+
+        if '👥 Users' in tabs and tabs['👥 Users'].open:
+            with tabs['👥 Users']:
+                # Most Busy Users (Group level)
+                st.markdown("<h2 style='text-align: center; color: #667eea;'>👥 Most Active Users</h2>",
+                            unsafe_allow_html=True)
+                # one value_counts on the categorical column, cheap enough to rerun
+                busy_users = helper.most_busy_users(df)
+                with profiling.timed('render.most_busy_users'):
+                    show_busy_users(busy_users)
+
+        if tabs['😀 Emojis'].open:
+            with tabs['😀 Emojis']:
+                # Emoji Analysis
+                st.markdown("<h2 style='text-align: center; color: #667eea;'>😀 Emoji Analysis</h2>", unsafe_allow_html=True)
+                emoji_df = analysis('emoji_helper', upload_key, selected_user, df)
+                with profiling.timed('render.emoji_helper'):
+                    show_emojis(emoji_df)
 
         # Footer
         st.markdown("---")
@@ -432,7 +661,6 @@ if uploaded_file is not None:
                 </div>
             """, unsafe_allow_html=True)
 
-
-
-
-
+    if show_perf:
+        with st.sidebar.expander("⏱️ Performance", expanded=True):
+            show_performance(records)
@@ -0,0 +1,217 @@
+"""Analyze many WhatsApp exports without the dashboard.
+
+    python batch.py exports/ --output reports/ --format parquet --jobs 8
+    python batch.py "exports/**/*.zip" --per-user
+
+Every .txt/.zip export found in the given directories or glob patterns is
+parsed with preprocessor.preprocess and summarized with the helper
+functions on a process pool. Reports contain the statistics, sentiment
+split, monthly and daily timelines, top words and top emojis:
+
+    json     one <chat>.json per export
+    parquet  one <section>.parquet per section, rows tagged with chat/user
+
+Per-file timings and the overall throughput are logged and written to
+timings.json / timings.parquet next to the reports.
+"""
+import argparse
+import glob
+import json
+import logging
+import os
+import sys
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+import helper
+import preprocessor
+import sentiment
+
+
+logger = logging.getLogger('batch')
+
+EXTENSIONS = ('.txt', '.zip')
+TOP_N = 20
+
+
+def find_exports(sources):
+    """Export files under directories (recursively) or matching glob patterns."""
+    paths = []
+    for source in sources:
+        if os.path.isdir(source):
+            for root, _, names in os.walk(source):
+                paths.extend(os.path.join(root, name) for name in names if name.lower().endswith(EXTENSIONS))
+        else:
+            paths.extend(path for path in glob.glob(source, recursive=True)
+                         if os.path.isfile(path) and path.lower().endswith(EXTENSIONS))
+    return sorted(set(paths))
+
+
+def chat_name(path, root=None):
+    """Report name of an export: its path relative to `root`, extension included.
+
+    The extension is kept so chat.txt and chat.zip in one directory get
+    separate reports (chat.txt.json, chat.zip.json) and chat tags."""
+    name = os.path.relpath(path, root) if root else os.path.basename(path)
+    return name.replace(os.sep, '__')
+
+
+def load(path):
+    if path.lower().endswith('.zip'):
+        with zipfile.ZipFile(path) as z:
+            with z.open(preprocessor.chat_member(z)) as f:
+                return preprocessor.preprocess(f)
+
+    with open(path, 'rb') as f:
+        return preprocessor.preprocess(f)
+
+
+def _ranking(counts, label):
+    # helper returns columns 0/1 (or an empty frame without columns)
+    if counts.empty:
+        counts = pd.DataFrame({0: [], 1: []})
+    return counts.set_axis([label, 'count'], axis=1).astype({label: str, 'count': 'int64'})
+
+
+def report(df, user):
+    messages, words, media, links = helper.fetch_statistics(user, df)
+    statistics = {'messages': messages, 'words': words, 'media': media, 'links': links}
+    statistics.update(helper.sentiment_analysis(user, df))
+
+    monthly = helper.monthly_timeline(user, df)
+    daily = helper.daily_timeline(user, df)
+    words = helper.most_common_words(user, df)
+    emojis = helper.emoji_helper(user, df)
+
+    return {
+        'statistics': pd.DataFrame([statistics]),
+        'monthly_timeline': monthly[['year', 'month_no', 'month', 'time', 'message']],
+        'daily_timeline': daily.assign(only_date=daily['only_date'].dt.strftime('%Y-%m-%d')),
+        'top_words': _ranking(words, 'word'),
+        'top_emojis': _ranking(emojis.head(TOP_N), 'emoji'),
+    }
+
+
+def analyze(path, name, per_user):
+    """Parse and summarize one export (runs in a worker process)."""
+    start = time.perf_counter()
+    df = load(path)
+    parsed = time.perf_counter()
+    df = helper.prepare_chat(df)
+
+    users = ['Overall']
+    if per_user:
+        users += sorted(df['users'].cat.categories)
+
+    sections = {}
+    for user in users:
+        for section, frame in report(df, user).items():
+            frame = frame.assign(user=user)
+            frame.insert(0, 'chat', name)
+            sections.setdefault(section, []).append(frame)
+    sections = {section: pd.concat(frames, ignore_index=True) for section, frames in sections.items()}
+    done = time.perf_counter()
+
+    timing = {
+        'chat': name,
+        'path': path,
+        'bytes': os.path.getsize(path),
+        'messages': len(df),
+        'parse_s': parsed - start,
+        'analyze_s': done - parsed,
+        'total_s': done - start,
+    }
+    return sections, timing
+
+
+def _init_worker():
+    # the pool already uses every core; don't fan sentiment out again
+    sentiment.engine.processes = 1
+
+
+def write_json(directory, name, sections):
+    data = {section: frame.drop(columns='chat').to_dict(orient='records')
+            for section, frame in sections.items()}
+    with open(os.path.join(directory, f'{name}.json'), 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=1, default=str)
+
+
+def write_parquet(directory, tables):
+    for section, frames in tables.items():
+        frame = pd.concat(frames, ignore_index=True)
+        frame.to_parquet(os.path.join(directory, f'{section}.parquet'), index=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('sources', nargs='+', help='directories or glob patterns of .txt/.zip exports')
+    parser.add_argument('--output', '-o', default='reports')
+    parser.add_argument('--format', '-f', choices=['json', 'parquet'], default='json')
+    parser.add_argument('--jobs', '-j', type=int, default=os.cpu_count())
+    parser.add_argument('--per-user', action='store_true', help='also report every participant')
+    parser.add_argument('--profile', action='store_true',
+                        help='also log the time of every parsing stage and helper call (JSON)')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    if not args.profile:
+        logging.getLogger('profiling').setLevel(logging.WARNING)
+
+    paths = find_exports(args.sources)
+    if not paths:
+        parser.error("no .txt or .zip exports found")
+    root = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in paths])
+    os.makedirs(args.output, exist_ok=True)
+    logger.info("analyzing %d exports with %d workers", len(paths), args.jobs)
+
+    start = time.perf_counter()
+    tables = {}
+    timings = []
+    failed = 0
+    with ProcessPoolExecutor(max_workers=args.jobs, initializer=_init_worker) as pool:
+        futures = {pool.submit(analyze, path, chat_name(os.path.abspath(path), root), args.per_user): path
+                   for path in paths}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                sections, timing = future.result()
+            except Exception as e:
+                failed += 1
+                logger.error("%s: failed: %s", path, e)
+                timings.append({'chat': chat_name(os.path.abspath(path), root), 'path': path, 'error': str(e)})
+                continue
+
+            timings.append(timing)
+            logger.info("%s: %d messages, %.1f MB in %.2f s (parse %.2f s, analyze %.2f s, %.0f msg/s)",
+                        path, timing['messages'], timing['bytes'] / 1e6, timing['total_s'],
+                        timing['parse_s'], timing['analyze_s'], timing['messages'] / timing['total_s'])
+
+            if args.format == 'json':
+                write_json(args.output, timing['chat'], sections)
+            else:
+                for section, frame in sections.items():
+                    tables.setdefault(section, []).append(frame)
+
+    if tables:
+        write_parquet(args.output, tables)
+
+    elapsed = time.perf_counter() - start
+    timings = pd.DataFrame(timings)
+    if args.format == 'json':
+        timings.to_json(os.path.join(args.output, 'timings.json'), orient='records', indent=1)
+    else:
+        timings.to_parquet(os.path.join(args.output, 'timings.parquet'), index=False)
+
+    messages = int(timings['messages'].sum()) if 'messages' in timings else 0
+    megabytes = timings['bytes'].sum() / 1e6 if 'bytes' in timings else 0
+    logger.info("%d exports (%d failed), %d messages, %.1f MB in %.2f s: %.1f files/s, %.0f msg/s, %.1f MB/s",
+                len(paths), failed, messages, megabytes, elapsed,
+                len(paths) / elapsed, messages / elapsed, megabytes / elapsed)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
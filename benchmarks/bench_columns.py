@@ -0,0 +1,62 @@
+"""Time and size the derived calendar columns: legacy strings vs categoricals.
+
+    python -m benchmarks.bench_columns --messages 1000000
+"""
+import argparse
+import time
+
+import preprocessor
+from benchmarks.synth import generate_chat
+
+
+def legacy_columns(df):
+    # the pre-categorical implementation: object strings and a per-row loop
+    df['users'] = df['users'].astype(object).str.strip().str.replace(r'\s+', ' ', regex=True)
+    df['only_date'] = df['date'].dt.date
+    df['year'] = df['date'].dt.year
+    df['month_no'] = df['date'].dt.month
+    df['month'] = df['date'].dt.month_name()
+    df['day'] = df['date'].dt.day
+    df['day_name'] = df['date'].dt.day_name()
+    df['hour'] = df['date'].dt.hour
+    df['minute'] = df['date'].dt.minute
+
+    period = []
+    for hour in df['hour']:
+        if hour == 23:
+            period.append(str(hour) + "-" + str('00'))
+        elif hour == 0:
+            period.append(str('00') + "-" + str(hour + 1))
+        else:
+            period.append(str(hour) + "-" + str(hour + 1))
+    df['period'] = period
+
+
+def run(label, fn, base):
+    df = base.copy()
+    start = time.perf_counter()
+    fn(df)
+    elapsed = time.perf_counter() - start
+    derived = df.drop(columns=['message', 'date'])
+    size = derived.memory_usage(deep=True).sum() / 1e6
+    print(f"{label:<12} {elapsed:8.2f} s  {size:10.1f} MB")
+    return elapsed, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    df = preprocessor.preprocess(generate_chat(args.messages))
+    base = df[['message', 'date']].copy()
+    base['users'] = df['users'].astype(object)
+
+    print(f"{args.messages:,} messages, derived columns (users/calendar/period):")
+    legacy_time, legacy_size = run('legacy', legacy_columns, base)
+    new_time, new_size = run('categorical', preprocessor._add_calendar_columns, base)
+    print(f"{legacy_time / new_time:.1f}x faster, {legacy_size / new_size:.1f}x smaller")
+
+
+if __name__ == '__main__':
+    main()
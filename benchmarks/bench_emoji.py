@@ -0,0 +1,58 @@
+"""Emoji extraction: legacy per-character loop vs the longest-match scanner.
+
+    python -m benchmarks.bench_emoji --messages 1000000
+"""
+import argparse
+import time
+from collections import Counter
+
+import emoji
+
+import emoji_scan
+import preprocessor
+from benchmarks.synth import generate_chat
+
+
+def legacy_emojis(messages):
+    # the previous emoji_helper: every character checked against EMOJI_DATA
+    emojis = []
+    for message in messages:
+        emojis.extend([c for c in message if c in emoji.EMOJI_DATA])
+    return Counter(emojis)
+
+
+def scanned_emojis(messages):
+    counts = Counter()
+    for found in emoji_scan.find_emojis(messages):
+        counts.update(found)
+    return counts
+
+
+def timed(label, fn, messages):
+    start = time.perf_counter()
+    counts = fn(messages)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<24} {elapsed:8.2f} s  {sum(counts.values()):>10,} emojis, {len(counts)} distinct")
+    return elapsed, counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    messages = preprocessor.preprocess(generate_chat(args.messages))['message']
+    emoji_scan._emoji_table()    # build outside the timing
+
+    legacy, legacy_counts = timed('legacy character loop', legacy_emojis, messages)
+    scanner, counts = timed('longest-match scanner', scanned_emojis, messages)
+    print(f"{legacy / scanner:.1f}x faster")
+
+    split = sorted(e for e in counts if len(e) > 1)
+    print("sequences the legacy loop split apart:", ' '.join(split))
+    print("legacy pieces with no emoji of their own:",
+          ' '.join(repr(e) for e in legacy_counts if e not in counts))
+
+
+if __name__ == '__main__':
+    main()
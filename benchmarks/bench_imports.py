@@ -0,0 +1,92 @@
+"""Import-time report: what the app loads before its first page, and what it defers.
+
+    python -m benchmarks.bench_imports --repeat 5 --output imports.json
+
+Runs `python -X importtime` in fresh interpreters. The startup set is the
+top-level imports of app.py (what every cold start pays before the
+welcome screen); each lazily loaded library is then timed on top of it,
+which is the cost helper.warm_up() moves off the first analysis. Times
+are the best of --repeat runs.
+"""
+import argparse
+import ast
+import json
+import os
+import subprocess
+import sys
+
+from benchmarks.run import environment
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# imported on first use by app.py / helper.py / emoji_scan.py / sentiment.py
+LAZY = ('plotly.express', 'plotly.graph_objects', 'wordcloud', 'urlextract', 'emoji', 'textblob')
+
+
+def startup_modules(path=os.path.join(ROOT, 'app.py')):
+    """Modules imported at the top level of a script."""
+    with open(path, encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.level == 0:
+            modules.append(node.module)
+    return list(dict.fromkeys(modules))
+
+
+def import_times(statement):
+    """{module: (self µs, cumulative µs)} for one fresh interpreter run of `statement`."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement],
+                            cwd=ROOT, capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        # nested imports are indented; only the top-level entries add up
+        if not name.startswith('  '):
+            times[name.strip()] = (int(own), int(cumulative))
+    return times
+
+
+def best_of(statement, repeat):
+    best = {}
+    for _ in range(repeat):
+        for name, (_, cumulative) in import_times(statement).items():
+            best[name] = min(best.get(name, cumulative), cumulative)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help='write the report to this JSON file')
+    args = parser.parse_args()
+
+    startup = startup_modules()
+    times = best_of('import ' + ', '.join(startup), args.repeat)
+    total = sum(times.values())
+    print(f"startup: {', '.join(startup)}")
+    for name, us in sorted(times.items(), key=lambda item: -item[1])[:15]:
+        print(f"  {name:<40} {us / 1000:9.1f} ms")
+    print(f"  {'total':<40} {total / 1000:9.1f} ms")
+
+    lazy = {}
+    print("\ndeferred (on top of startup):")
+    for name in LAZY:
+        statement = 'import ' + ', '.join(startup) + f'; import {name}'
+        lazy[name] = sum(us for module, us in best_of(statement, args.repeat).items() if module not in times)
+        print(f"  {name:<40} {lazy[name] / 1000:9.1f} ms")
+
+    if args.output:
+        report = {'environment': environment(), 'startup_modules': startup, 'startup_us': times,
+                  'startup_total_us': total, 'deferred_us': lazy}
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""Compare sentiment scoring backends on a synthetic chat.
+
+    python -m benchmarks.bench_sentiment --messages 100000
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+import preprocessor
+import scheduler
+import sentiment
+from benchmarks.synth import generate_chat
+
+
+def labels(scores):
+    scores = np.asarray(scores)
+    return np.select([scores > 0.1, scores < -0.1], ['positive', 'negative'], 'neutral')
+
+
+def legacy_per_render(texts):
+    # what sentiment_analysis + sentiment_timeline used to do on every render
+    sentiment.textblob_scores(texts)
+    return sentiment.textblob_scores(texts)
+
+
+def timed(label, fn, texts):
+    start = time.perf_counter()
+    scores = fn(texts)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<34} {elapsed:8.2f} s  ({len(texts) / elapsed:,.0f} msg/s)")
+    return elapsed, scores
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=100_000)
+    parser.add_argument('--processes', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+    # the engine scores its batches on the shared PROCESS pool
+    scheduler.scheduler = scheduler.Scheduler(max_processes=args.processes)
+
+    df = preprocessor.preprocess(generate_chat(args.messages))
+    texts = df['message'].tolist()
+    distinct = df['message'].str.strip().nunique()
+    print(f"{len(texts):,} messages, {distinct:,} distinct texts")
+
+    legacy, reference = timed('legacy TextBlob per message (x2)', legacy_per_render, texts)
+
+    engines = [
+        ('engine textblob, 1 process', sentiment.SentimentEngine('textblob', processes=1)),
+        (f'engine textblob, {args.processes} processes',
+         sentiment.SentimentEngine('textblob', processes=args.processes, parallel_threshold=0)),
+        ('engine lexicon (vectorized)', sentiment.SentimentEngine('lexicon', processes=1)),
+    ]
+    for label, engine in engines:
+        elapsed, scores = timed(label, engine.score, texts)
+        agreement = (labels(scores) == labels(reference)).mean() * 100
+        print(f"{'':<34} {legacy / elapsed:6.1f}x vs legacy, {agreement:.1f}% same labels as TextBlob")
+
+    engine = engines[0][1]
+    timed('engine textblob, memoized rerun', engine.score, texts)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""Time the timestamp/author/body split: legacy per-row loop vs single regex pass.
+
+    python -m benchmarks.bench_split --messages 1000000
+"""
+import argparse
+import re
+import time
+
+import preprocessor
+from benchmarks.synth import generate_chat
+
+
+def legacy_split(data):
+    # the pre-streaming implementation: split + findall, then re.split per row
+    pattern = r'\d{1,2}/\d{1,2}/\d{2,4},\s\d{1,2}:\d{2}\s-\s'
+    messages = re.split(pattern, data)[1:]
+    dates = re.findall(pattern, data)
+
+    users = []
+    bodies = []
+    for message in messages:
+        entry = re.split(r'([\w\W]+?):\s', message)
+        if entry[1:]:
+            users.append(entry[1])
+            bodies.append(" ".join(entry[2:]))
+        else:
+            users.append('group_notification')
+            bodies.append(entry[0])
+    return dates, users, bodies
+
+
+def single_pass_split(data):
+    dates, users, bodies = [], [], []
+    chat_format, _ = preprocessor.detect_format(data[:preprocessor.SAMPLE_SIZE])
+    chunks = preprocessor._read_chunks(data, preprocessor.CHUNK_SIZE)
+    for chunk_dates, chunk_users, chunk_bodies in preprocessor._iter_messages(chunks, chat_format['message_start']):
+        dates.extend(chunk_dates)
+        users.extend(chunk_users)
+        bodies.extend(chunk_bodies)
+    return dates, users, bodies
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    data = generate_chat(args.messages)
+    print(f"synthetic chat: {args.messages:,} messages, {len(data) / 1e6:.1f} MB")
+
+    legacy, (dates, _, _) = timed(legacy_split, data)
+    single, (new_dates, _, _) = timed(single_pass_split, data)
+    assert len(dates) == len(new_dates)
+
+    print(f"legacy re.split loop : {legacy:8.2f} s")
+    print(f"single regex pass    : {single:8.2f} s  ({legacy / single:.1f}x faster)")
+
+    total, df = timed(preprocessor.preprocess, data)
+    print(f"full preprocess      : {total:8.2f} s  ({len(df):,} rows)")
+
+
+if __name__ == '__main__':
+    main()
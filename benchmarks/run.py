@@ -0,0 +1,193 @@
+"""Time and memory-profile preprocess and the helper functions.
+
+    python -m benchmarks.run --sizes 10000 100000 1000000 --output results.json
+    python -m benchmarks.run --sizes 100000 --baseline results.json
+
+Every stage runs on a fresh synthetic export of each size: preprocess,
+the preparation steps (features, user index, summaries), the deferred
+sentiment scoring and each helper for 'Overall' and one participant.
+Times are the best of --repeat runs; peak memory is measured by
+tracemalloc in a separate run so tracing does not skew the times. Results are written as JSON (one record per size,
+stage and user, plus the commit and environment) and can be compared
+against an earlier file with --baseline.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+import helper
+import preprocessor
+import sentiment
+from benchmarks.synth import LOCALES, generate_chat
+
+
+HELPERS = [
+    ('fetch_statistics', ()),
+    ('sentiment_analysis', ()),
+    ('sentiment_timeline', ('D',)),
+    ('sentiment_timeline', ('M',)),
+    ('sentiment_timeline', ('auto',)),
+    ('most_common_words', ()),
+    ('word_frequencies', ()),
+    ('emoji_helper', ()),
+    ('monthly_timeline', ()),
+    ('daily_timeline', ()),
+    ('week_activity_map', ()),
+    ('month_activity_map', ()),
+    ('activity_heatmap', ()),
+]
+
+
+def measure(fn, repeat, setup=None):
+    """(result, best seconds, peak traced MB) of fn(), calling setup() before each run."""
+    best = float('inf')
+    for _ in range(repeat):
+        if setup:
+            setup()
+        gc.collect()
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+
+    if setup:
+        setup()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, best, peak / 1e6
+
+
+def bench_size(n_messages, args):
+    text = generate_chat(n_messages, seed=args.seed, locale=args.locale, url_rate=args.url_rate)
+    # a fresh engine per size, so memoized scores of a smaller run don't leak in
+    sentiment.engine = sentiment.SentimentEngine(args.sentiment_backend)
+    records = []
+
+    def record(stage, seconds, peak_mb, user=None, rows=None):
+        records.append({'messages': n_messages, 'stage': stage, 'user': user, 'seconds': seconds,
+                        'peak_mb': peak_mb, 'rows_per_s': rows / seconds if rows and seconds else None})
+        label = f"{stage} [{user}]" if user else stage
+        print(f"{n_messages:>9,} {label:<42} {seconds:9.4f} s {peak_mb:10.1f} MB", flush=True)
+
+    df, seconds, peak = measure(lambda: preprocessor.preprocess(text), args.repeat)
+    record('preprocess', seconds, peak, rows=len(df))
+
+    # the steps of helper.prepare_chat, timed one by one
+    df = df[df['users'] != 'group_notification']
+    df['users'] = df['users'].cat.remove_unused_categories()
+
+    df, seconds, peak = measure(lambda: helper.add_message_features(df, helper.PREPARED_FEATURES), args.repeat)
+    record('add_message_features', seconds, peak, rows=len(df))
+    df, seconds, peak = measure(lambda: helper.index_users(df), args.repeat)
+    record('index_users', seconds, peak, rows=len(df))
+    df, seconds, peak = measure(lambda: helper.summarize_users(df), args.repeat)
+    record('summarize_users', seconds, peak, rows=len(df))
+
+    # deferred until the first sentiment helper call; scored from scratch
+    # every run (engine memo and per-frame result dropped)
+    def forget_sentiment():
+        sentiment.engine.clear()
+        helper._attach(df, 'sentiment', None)
+
+    _, seconds, peak = measure(lambda: helper.summarize_sentiment(df), args.repeat, setup=forget_sentiment)
+    record('summarize_sentiment', seconds, peak, rows=len(df))
+
+    # word counts are memoized per frame; drop them so every call counts
+    def forget_words():
+        helper._attach(df, 'word_counts', None)
+
+    _, seconds, peak = measure(lambda: helper.most_busy_users(df), args.repeat)
+    record('most_busy_users', seconds, peak)
+    user = df['users'].value_counts().index[0]
+    for name, extra in HELPERS:
+        stage = name + (f"({', '.join(extra)})" if extra else '')
+        for selected in ('Overall', user):
+            _, seconds, peak = measure(lambda: getattr(helper, name)(selected, df, *extra), args.repeat,
+                                       setup=forget_words)
+            record(stage, seconds, peak, user=selected)
+
+    return records
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def compare(results, baseline, threshold):
+    """Print the time ratio of every stage also present in the baseline."""
+    before = {(r['messages'], r['stage'], r['user']): r for r in baseline['results']}
+    print(f"\nvs {baseline['environment'].get('commit') or 'baseline'}:")
+    regressions = 0
+    for r in results:
+        old = before.get((r['messages'], r['stage'], r['user']))
+        if old is None or not old['seconds']:
+            continue
+        ratio = r['seconds'] / old['seconds']
+        flag = ''
+        if ratio > threshold and r['seconds'] - old['seconds'] > 0.005:
+            flag = '  <-- slower'
+            regressions += 1
+        label = f"{r['stage']} [{r['user']}]" if r['user'] else r['stage']
+        print(f"{r['messages']:>9,} {label:<42} {old['seconds']:9.4f} -> {r['seconds']:9.4f} s  x{ratio:5.2f}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--locale', choices=sorted(LOCALES), default='android')
+    parser.add_argument('--url-rate', type=float, default=0.02)
+    parser.add_argument('--sentiment-backend', default='textblob', choices=sorted(sentiment.BACKENDS))
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='compare against an earlier results file')
+    parser.add_argument('--threshold', type=float, default=1.2,
+                        help='time ratio above which a stage counts as a regression')
+    args = parser.parse_args()
+
+    results = []
+    for n_messages in args.sizes:
+        results.extend(bench_size(n_messages, args))
+
+    report = {'environment': environment(), 'arguments': vars(args), 'results': results}
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=1)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""Deterministic synthetic WhatsApp exports for the benchmarks.
+
+    python -m benchmarks.synth --messages 100000 --locale ios > chat.txt
+"""
+import argparse
+import random
+import sys
+from datetime import datetime, timedelta
+
+
+USERS = ['Aarav', 'Priya', 'Rahul Sharma', 'Sneha', '+91 98765 43210', 'Vikram', 'Ananya', 'Kabir']
+
+# single code points, skin tones, ZWJ families, flags and keycaps
+EMOJIS = ('😂', '❤️', '👍', '👍🏽', '🙏🏻', '🔥', '😭', '👨‍👩‍👧', '🏳️‍🌈', '🇮🇳', '#️⃣')
+
+WORDS = ('haan', 'nahi', 'kal', 'milte', 'hai', 'ok', 'haha', 'good', 'morning', 'bro', 'movie',
+         'dinner', 'where', 'are', 'you', 'coming', 'late', 'traffic', 'awesome', 'bad', 'sorry')
+
+URLS = ('https://youtu.be/dQw4w9WgXcQ', 'https://www.example.com/menu?id=42', 'www.google.com/maps',
+        'http://bit.ly/3xYz', 'instagram.com/p/Cabc123')
+
+
+def _android(ts):
+    return f"{ts.day}/{ts.month}/{ts.strftime('%y')}, {ts.strftime('%H:%M')} - "
+
+
+def _android_12h(ts):
+    # US month-first order, narrow no-break space before a lower-case am/pm
+    hour = ts.hour % 12 or 12
+    return f"{ts.month}/{ts.day}/{ts.strftime('%y')}, {hour}:{ts.strftime('%M')} {ts.strftime('%p').lower()} - "
+
+
+def _ios(ts):
+    return f"[{ts.strftime('%d/%m/%Y, %H:%M:%S')}] "
+
+
+def _dotted(ts):
+    return f"{ts.strftime('%d.%m.%y, %H:%M')} - "
+
+
+# locale -> (timestamp header, media placeholder)
+LOCALES = {
+    'android': (_android, '<Media omitted>'),
+    'android_12h': (_android_12h, '<Media omitted>'),
+    'ios': (_ios, '‎image omitted'),
+    'dotted': (_dotted, '<Media omitted>'),
+}
+
+
+def generate_chat(n_messages, n_users=len(USERS), seed=0, start=datetime(2021, 1, 1), end=None,
+                  locale='android', multiline_rate=0.04, emoji_rate=0.15, url_rate=0.0, media_rate=0.05):
+    """Return the text of an export with `n_messages` messages.
+
+    The same arguments always give the same text. Messages are spread
+    evenly (at random) from `start` to about `end`, or 0-90 minutes apart; `locale`
+    picks the timestamp layout (see LOCALES). The rates are the share of
+    text messages with a continuation line, emojis or a URL, and the share
+    of media placeholders; about 1% of the lines are group notifications."""
+    if locale not in LOCALES:
+        raise ValueError(f"locale must be one of {sorted(LOCALES)}, got {locale!r}")
+    header_for, media = LOCALES[locale]
+
+    rng = random.Random(seed)
+    users = USERS[:n_users]
+    if n_users > len(USERS):
+        users += [f'User {i}' for i in range(len(USERS), n_users)]
+
+    # messages are on average `step` minutes apart
+    step = None if end is None else (end - start).total_seconds() / 60 / max(n_messages, 1)
+    lines = []
+    ts = start
+
+    for i in range(n_messages):
+        ts += timedelta(minutes=rng.randint(0, 90) if end is None else rng.uniform(0, 2 * step))
+        header = header_for(ts)
+
+        roll = rng.random()
+        if roll < 0.01:
+            lines.append(f"{header}{rng.choice(users)} added {rng.choice(users)}")
+            continue
+        if roll < 0.01 + media_rate:
+            body = media
+        else:
+            body = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 12)))
+            if rng.random() < emoji_rate:
+                body += ' ' + ''.join(rng.choice(EMOJIS) for _ in range(rng.randint(1, 3)))
+            if url_rate and rng.random() < url_rate:
+                body += ' ' + rng.choice(URLS)
+            if roll < 0.10:
+                body += ': note ' + ' '.join(rng.choice(WORDS) for _ in range(3))
+            elif roll < 0.10 + multiline_rate:
+                body += '\n' + ' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 6)))
+
+        lines.append(f"{header}{rng.choice(users)}: {body}")
+
+    return '\n'.join(lines) + '\n'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=10_000)
+    parser.add_argument('--users', type=int, default=len(USERS))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--start', type=datetime.fromisoformat, default=datetime(2021, 1, 1))
+    parser.add_argument('--end', type=datetime.fromisoformat)
+    parser.add_argument('--locale', choices=sorted(LOCALES), default='android')
+    parser.add_argument('--multiline-rate', type=float, default=0.04)
+    parser.add_argument('--emoji-rate', type=float, default=0.15)
+    parser.add_argument('--url-rate', type=float, default=0.0)
+    parser.add_argument('--media-rate', type=float, default=0.05)
+    args = parser.parse_args()
+
+    sys.stdout.reconfigure(encoding='utf-8')
+    sys.stdout.write(generate_chat(args.messages, args.users, args.seed, args.start, args.end, args.locale,
+                                   args.multiline_rate, args.emoji_rate, args.url_rate, args.media_rate))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,336 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import preprocessor
+
+
+logger = logging.getLogger(__name__)
+
+HASH_CHUNK_SIZE = 1 << 20
+HEAD_SIZE = 64 * 1024    # bytes hashed to find earlier exports of a chat
+
+
+def content_hash(f):
+    """SHA-256 of an uploaded file's bytes, read in chunks.
+
+    The file position is restored to the start so it can still be parsed."""
+    digest = hashlib.sha256()
+    f.seek(0)
+    for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+        digest.update(chunk)
+    f.seek(0)
+    return digest.hexdigest()
+
+
+def frame_size(df):
+    return int(df.memory_usage(deep=True).sum())
+
+
+class ParseCache:
+    """Bounded LRU of parsed chats, keyed by the upload's content hash.
+
+    Streamlit re-runs app.py on every widget change; with this cache a
+    rerun for the same upload reuses the parsed frame instead of parsing
+    the export again. Entries are evicted least recently used first once
+    either `max_entries` or `max_bytes` (deep memory usage) is exceeded.
+    The cache is shared by all sessions of the server process.
+
+    Other rendered results can be kept the same way by passing their own
+    `sizeof` (bytes of a value) and a `name` for the log messages."""
+
+    def __init__(self, max_entries=8, max_bytes=1 << 30, sizeof=frame_size, name='parse'):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()   # key -> (value, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                logger.info("%s cache miss %s (%s)", self.name, key[:12], self._stats())
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            logger.info("%s cache hit %s (%s)", self.name, key[:12], self._stats())
+            return entry[0]
+
+    def put(self, key, value):
+        size = self.sizeof(value)
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+
+            # never evict the entry that was just added
+            while len(self._entries) > 1 and (
+                    len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                evicted, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                logger.info("%s cache evicted %s (%d bytes)", self.name, evicted[:12], evicted_size)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return self._stats()
+
+    def _stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': len(self._entries),
+            'bytes': self._bytes,
+        }
+
+
+class ExportHistory:
+    """Remembers parsed exports so a newer export of the same chat is recognized.
+
+    WhatsApp re-exports a chat as the old transcript plus the new messages,
+    so a new transcript extends an old one when its first `size` bytes hash
+    to the old transcript's digest. Candidates are narrowed down by the
+    hash of the first HEAD_SIZE bytes; the longest matching export wins.
+    Only metadata is kept here, the frames themselves live in parse_cache
+    and disk_cache. With a `path` the entries are also kept in that JSON
+    file, so they survive restarts (and are shared by server processes)."""
+
+    def __init__(self, max_entries=256, path=None):
+        self.max_entries = max_entries
+        self.path = path
+        self._entries = OrderedDict()   # transcript digest -> entry
+        self._lock = threading.Lock()
+        self._entries.update(self._load())
+
+    def _load(self):
+        if self.path is None:
+            return []
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return []
+        except (OSError, ValueError):
+            logger.exception("ignoring unreadable export history %s", self.path)
+            return []
+
+    def _merge_saved(self):
+        # pick up exports recorded since by other server processes
+        for key, value in self._load():
+            self._entries.setdefault(key, value)
+
+    def _save(self):
+        directory = os.path.dirname(self.path)
+        os.makedirs(directory, exist_ok=True)
+        # write to a temporary file first so readers never see partial files
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(list(self._entries.items()), f)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            logger.exception("could not write export history %s", self.path)
+            DiskCache._remove(tmp_path)
+
+    def record(self, f, upload_key, chat_format, date_format):
+        """Remember the transcript `f` (a binary stream at its start) of an upload."""
+        head = f.read(HEAD_SIZE)
+        digest = hashlib.sha256(head)
+        size = len(head)
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+            size += len(chunk)
+
+        entry = {
+            'upload_key': upload_key,
+            'size': size,
+            'head': hashlib.sha256(head).hexdigest(),
+            'chat_format': chat_format,
+            'date_format': date_format,
+        }
+        with self._lock:
+            self._merge_saved()
+            self._entries[digest.hexdigest()] = entry
+            self._entries.move_to_end(digest.hexdigest())
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            if self.path is not None:
+                self._save()
+
+    def find_base(self, f):
+        """The entry of the longest recorded transcript that `f` extends, or None.
+
+        `f` is read from its current position; when an entry is returned the
+        caller should continue reading at offset entry['size']."""
+        head = f.read(HEAD_SIZE)
+        with self._lock:
+            self._merge_saved()
+            entries = list(self._entries.items())
+        candidates = []
+        for digest, entry in entries:
+            if entry['size'] > len(head) and len(head) < HEAD_SIZE:
+                continue   # the new transcript is shorter than this one
+            if hashlib.sha256(head[:entry['size']]).hexdigest() == entry['head']:
+                candidates.append((entry['size'], digest, entry))
+        if not candidates:
+            return None
+        candidates.sort(key=lambda candidate: candidate[0])
+
+        # one pass over the new transcript, checking every candidate's prefix
+        best = None
+        digest = hashlib.sha256()
+        buffer, position = head, 0
+        for size, expected, entry in candidates:
+            while position + len(buffer) < size:
+                digest.update(buffer)
+                position += len(buffer)
+                buffer = f.read(HASH_CHUNK_SIZE)
+                if not buffer:
+                    return best
+            cut = size - position
+            digest.update(buffer[:cut])
+            position, buffer = size, buffer[cut:]
+            if digest.copy().hexdigest() == expected:
+                best = entry
+        return best
+
+
+class DiskCache:
+    """Parsed chats stored as uncompressed Feather (Arrow IPC) files.
+
+    Files are named after the content hash and preprocessor.PARSER_VERSION,
+    so a parser change never serves frames produced by older code; entries
+    of other versions are removed on the next cleanup. Reads memory-map the
+    file instead of parsing the export again. Once the directory grows past
+    `max_bytes` the least recently used files are deleted (access time is
+    tracked through the file's mtime). Without pyarrow the cache is a no-op."""
+
+    suffix = '.feather'
+
+    def __init__(self, directory, max_bytes=2 << 30):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        try:
+            from pyarrow import feather
+        except ImportError:
+            logger.warning("pyarrow is not installed, on-disk parse cache disabled")
+            feather = None
+        self._feather = feather
+
+    def _path(self, key):
+        name = f"{key}-v{preprocessor.PARSER_VERSION}{self.suffix}"
+        return os.path.join(self.directory, name)
+
+    def get(self, key):
+        if self._feather is None:
+            return None
+
+        path = self._path(key)
+        try:
+            df = self._feather.read_table(path, memory_map=True).to_pandas()
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except Exception:
+            logger.exception("dropping unreadable cache file %s", path)
+            self._remove(path)
+            self.misses += 1
+            return None
+
+        try:
+            # recently read files are the last to go in cleanup()
+            os.utime(path)
+        except OSError:
+            # removed by another process's cleanup() since; the frame was read
+            pass
+        self.hits += 1
+        logger.info("disk cache hit %s", key[:12])
+        return df
+
+    def put(self, key, df):
+        if self._feather is None:
+            return
+
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        # write to a temporary file first so readers never see partial files
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        os.close(fd)
+        try:
+            self._feather.write_feather(df, tmp_path, compression='uncompressed')
+            os.replace(tmp_path, path)
+        except Exception:
+            logger.exception("could not write cache file %s", path)
+            self._remove(tmp_path)
+            return
+
+        self.cleanup()
+
+    def cleanup(self):
+        """Delete stale-version files, then LRU files beyond `max_bytes`."""
+        current = f"-v{preprocessor.PARSER_VERSION}{self.suffix}"
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.name.endswith(self.suffix):
+                    continue
+                if not entry.name.endswith(current):
+                    self._remove(entry.path)
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    # just removed by another process
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+CACHE_DIR = os.environ.get('CHAT_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'chatrecap'))
+
+# one cache per server process, shared across reruns and sessions
+parse_cache = ParseCache()
+
+# word cloud images as PNG data URIs (a few hundred KB each)
+render_cache = ParseCache(max_entries=64, max_bytes=128 << 20, sizeof=len, name='render')
+
+disk_cache = DiskCache(CACHE_DIR, max_bytes=int(os.environ.get('CHAT_CACHE_MAX_MB', 2048)) << 20)
+
+# earlier exports of each chat, for incremental re-analysis; kept next to
+# the parsed frames (per parser version, like them)
+export_history = ExportHistory(
+    path=os.path.join(CACHE_DIR, f'exports-v{preprocessor.PARSER_VERSION}.json'))
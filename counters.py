@@ -0,0 +1,97 @@
+import heapq
+import itertools
+from collections import Counter
+
+
+CHUNK_SIZE = 10_000      # messages tokenized at a time
+TOP_K_CAPACITY = 5_000   # items tracked by the approximate counter
+
+
+class TopKCounter:
+    """Counts items fed in chunks, exactly or with bounded memory.
+
+    With `capacity=None` every distinct item is counted exactly. Otherwise
+    the (weighted) Space-Saving algorithm keeps at most `capacity` items:
+    when a new item arrives and the table is full, the item with the
+    smallest count is replaced and the newcomer inherits that count as its
+    possible overestimate (kept in `errors`). Every item whose true count
+    exceeds total / capacity is guaranteed to be tracked."""
+
+    def __init__(self, capacity=None):
+        self.capacity = capacity
+        self._counts = Counter()
+        self.errors = {}
+        self._heap = []              # (count, tie-breaker, item), one entry per item
+        self._sequence = itertools.count()
+
+    def update(self, items):
+        """Count an iterable of items (one chunk)."""
+        self.update_counts(Counter(items))
+
+    def update_counts(self, counts):
+        """Add a mapping of item -> count (e.g. a chunk's Counter)."""
+        if self.capacity is None:
+            self._counts.update(counts)
+            return
+
+        for item, count in counts.items():
+            self._add(item, count)
+
+    def _add(self, item, count):
+        counts = self._counts
+        if item in counts:
+            # the heap entry is now stale; it is refreshed when it surfaces
+            counts[item] += count
+            return
+
+        if len(counts) < self.capacity:
+            counts[item] = count
+            self.errors[item] = 0
+            heapq.heappush(self._heap, (count, next(self._sequence), item))
+            return
+
+        while True:
+            smallest, _, victim = heapq.heappop(self._heap)
+            if counts[victim] == smallest:
+                break
+            heapq.heappush(self._heap, (counts[victim], next(self._sequence), victim))
+
+        del counts[victim]
+        del self.errors[victim]
+        counts[item] = smallest + count
+        self.errors[item] = smallest
+        heapq.heappush(self._heap, (smallest + count, next(self._sequence), item))
+
+    def most_common(self, n=None):
+        """The `n` (default: all tracked) largest counts, ties in first-seen order."""
+        return self._counts.most_common(n)
+
+    def __len__(self):
+        return len(self._counts)
+
+
+def count_words(messages, stop_words=frozenset(), capacity=None, chunk_size=CHUNK_SIZE):
+    """Count lower-cased words of `messages` (a Series) chunk by chunk.
+
+    Only one chunk's tokens exist at a time, so memory is bounded by the
+    chunk plus the counter (all distinct words, or `capacity` of them)."""
+    counter = TopKCounter(capacity)
+    for start in range(0, len(messages), chunk_size):
+        text = ' '.join(messages.iloc[start:start + chunk_size]).lower()
+        chunk_counts = Counter(text.split())
+        for word in stop_words.intersection(chunk_counts):
+            del chunk_counts[word]
+        counter.update_counts(chunk_counts)
+    return counter
+
+
+def count_items(sequences, capacity=None, chunk_size=CHUNK_SIZE):
+    """Count the items of an iterable of sequences (e.g. emoji tuples) chunk by chunk."""
+    counter = TopKCounter(capacity)
+    sequences = iter(sequences)
+    while True:
+        chunk = list(itertools.islice(sequences, chunk_size))
+        if not chunk:
+            break
+        counter.update(itertools.chain.from_iterable(chunk))
+    return counter
@@ -0,0 +1,63 @@
+import functools
+
+import numpy as np
+
+
+# emojis always contain a non-ASCII code point (keycaps start with #, * or a
+# digit), so only these runs are scanned
+CANDIDATE_PATTERN = r'[^\x00-\x7f]'
+EMOJI_RUN = r'[#*0-9]?[^\x00-\x7f]+'
+
+
+@functools.lru_cache(maxsize=None)
+def _emoji_table():
+    # the emoji package is imported here, on first use (it is slow to load)
+    import emoji
+
+    sequences = frozenset(emoji.EMOJI_DATA)
+    first_chars = frozenset(sequence[0] for sequence in sequences)
+    longest = max(len(sequence) for sequence in sequences)
+    return sequences, first_chars, longest
+
+
+def _scan_run(run, sequences, first_chars, longest):
+    found = []
+    i = 0
+    n = len(run)
+    while i < n:
+        if run[i] in first_chars:
+            # longest match first: ZWJ sequences, skin tones, flags, keycaps
+            for length in range(min(longest, n - i), 0, -1):
+                candidate = run[i:i + length]
+                if candidate in sequences:
+                    found.append(candidate)
+                    i += length
+                    break
+            else:
+                i += 1
+        else:
+            i += 1
+    return found
+
+
+def find_emojis(messages):
+    """Tuple of the emojis in each message of a Series.
+
+    Whole sequences are matched against emoji.EMOJI_DATA, longest first, so
+    👨‍👩‍👧, 👍🏽 and 🇮🇳 count as one emoji each instead of being split into
+    their code points. A vectorized pre-check skips plain-ASCII messages
+    and one str.findall cuts the non-ASCII runs out of the rest, so only
+    those runs are looked at character by character."""
+    table = _emoji_table()
+    found = [()] * len(messages)
+    candidates = np.flatnonzero(messages.str.contains(CANDIDATE_PATTERN, regex=True, na=False).to_numpy())
+    if not len(candidates):
+        return found
+
+    for position, runs in zip(candidates, messages.iloc[candidates].str.findall(EMOJI_RUN)):
+        emojis = []
+        for run in runs:
+            emojis.extend(_scan_run(run, *table))
+        if emojis:
+            found[position] = tuple(emojis)
+    return found
@@ -1,128 +1,512 @@
 
-from urlextract import URLExtract
-from wordcloud import WordCloud
+import numpy as np
 import pandas as pd
 from collections import Counter
-import emoji
-from textblob import TextBlob
+import base64
+import functools
+import io
+import itertools
+import logging
+import os
+import re
+import threading
+import weakref
 
+import counters
+import downsample
+import emoji_scan
+import preprocessor
+import profiling
+import sentiment
+from scheduler import THREAD
 
 
+logger = logging.getLogger(__name__)
 
+
+# Android writes "<Media omitted>", iOS "image omitted" / "<attached: ...>"
+MEDIA_PATTERN = r'<Media omitted>|\b(?:image|video|audio|sticker|GIF|document) omitted|<attached: '
+
+
+# a URL always has a dot directly followed by its TLD; messages without one
+# are skipped before the (much slower) URLExtract scan
+URL_CANDIDATE_PATTERN = r'\.\w'
+
+_url_extractor = None
+
+
+def url_extractor():
+    """Process-wide URLExtract instance (loading its TLD list is costly)."""
+    global _url_extractor
+    if _url_extractor is None:
+        from urlextract import URLExtract
+
+        _url_extractor = URLExtract()
+    return _url_extractor
+
+
+def count_urls(messages):
+    """Number of URLs per message, running URLExtract only where one may be."""
+    counts = np.zeros(len(messages), dtype='int32')
+    candidates = messages.str.contains(URL_CANDIDATE_PATTERN, regex=True, na=False).to_numpy()
+    if candidates.any():
+        extract = url_extractor()
+        counts[candidates] = [len(extract.find_urls(m)) for m in messages[candidates]]
+    return counts
+
+
+def _media_flags(df):
+    return df['message'].str.contains(MEDIA_PATTERN, regex=True, na=False)
+
+
+def _polarities(df):
+    # each distinct text is scored once (and memoized across calls)
+    media = df['is_media'] if 'is_media' in df.columns else _media_flags(df)
+    polarity = pd.Series(np.nan, index=df.index)
+    polarity[~media] = sentiment.engine.score(df.loc[~media, 'message'])
+    return polarity
+
+
+# column -> function computing it from the frame, in dependency order
+FEATURES = {
+    'is_media': _media_flags,
+    'word_count': lambda df: df['message'].str.split().str.len().fillna(0).astype('int32'),
+    'url_count': lambda df: count_urls(df['message']),
+    'emojis': lambda df: emoji_scan.find_emojis(df['message']),
+    'polarity': _polarities,
+}
+
+# what prepare_chat computes up front; polarity (by far the slowest) is
+# scored by summarize_sentiment once a sentiment analysis is asked for
+PREPARED_FEATURES = ('is_media', 'word_count', 'url_count', 'emojis')
+
+
+def _feature(name, df):
+    with profiling.timed('feature.' + name, rows=len(df)):
+        return FEATURES[name](df)
+
+
+@profiling.profiled
+def add_message_features(df, columns=None, scheduler=None):
+    """Add the per-message columns every analysis reads, in one pass.
+
+    is_media   -- the message is a media placeholder
+    word_count -- whitespace-separated words
+    url_count  -- URLs found by URLExtract
+    emojis     -- tuple of the emojis in the message (whole sequences)
+    polarity   -- sentiment.engine polarity (NaN for media messages)
+
+    Only `columns` (default: all) that are not present yet are computed.
+    Returns a new frame; the helpers below call this themselves for frames
+    that were not enriched up front. With a scheduler.Scheduler the columns
+    are computed concurrently on its threads (sentiment.engine sends large
+    polarity batches on to the PROCESS pool)."""
+    missing = [name for name in FEATURES
+               if (columns is None or name in columns) and name not in df.columns]
+    if not missing:
+        return df
+
+    if scheduler is None:
+        df = df.copy()
+        for name in missing:
+            df[name] = _feature(name, df)
+        return df
+
+    # every task reads the original frame; columns are added to the copy
+    # from this thread only
+    enriched = df.copy()
+    for name, values in scheduler.run({name: (THREAD, _feature, name, df) for name in missing}):
+        enriched[name] = values
+    return enriched[list(df.columns) + missing]
+
+
+def _with_features(df, *columns):
+    return add_message_features(df, columns or None)
+
+
+# id(frame) -> (weak reference to the frame, {name: precomputed data}), for
+# data derived once from a full chat frame (user row ranges, aggregates)
+_precomputed = {}
+
+
+def _attach(df, name, value):
+    key = id(df)
+    entry = _precomputed.get(key)
+    if entry is None or entry[0]() is not df:
+        entry = (weakref.ref(df, lambda _: _precomputed.pop(key, None)), {})
+        _precomputed[key] = entry
+    entry[1][name] = value
+
+
+def _lookup(df, name):
+    entry = _precomputed.get(id(df))
+    if entry is not None and entry[0]() is df:
+        return entry[1].get(name)
+    return None
+
+
+@profiling.profiled
+def index_users(df):
+    """Sort the chat by user and remember every user's row range.
+
+    Rows keep their chronological order within a user (stable sort). For the
+    returned frame the helpers take a user's rows as a zero-copy iloc slice
+    instead of scanning and copying the whole frame on every call."""
+    users = df['users'].astype('category')
+    order = np.argsort(users.cat.codes.to_numpy(), kind='stable')
+    df = df.take(order).reset_index(drop=True)
+
+    counts = np.bincount(users.cat.codes.to_numpy(), minlength=len(users.cat.categories))
+    stops = np.cumsum(counts)
+    ranges = {user: (int(stop - count), int(stop))
+              for user, count, stop in zip(users.cat.categories, counts, stops) if count}
+
+    _attach(df, 'user_ranges', ranges)
+    return df
+
+
+def _select_user(selected_user, df):
+    if selected_user == 'Overall':
+        return df
+
+    ranges = _lookup(df, 'user_ranges')
+    if ranges is not None:
+        start, stop = ranges.get(selected_user, (0, 0))
+        return df.iloc[start:stop]
+
+    return df[df['users'] == selected_user]
+
+
+def _cube_frame(counts):
+    """Calendar columns for a (only_date, hour) -> message count series."""
+    cube = counts.rename('count').reset_index()
+    dates = cube['only_date'].dt
+    hour = cube['hour'].astype('int8')
+    month_no = dates.month.astype('int8')
+
+    cube['year'] = dates.year.astype('int16')
+    cube['month_no'] = month_no
+    cube['month'] = pd.Categorical.from_codes(month_no - 1, preprocessor.MONTHS, ordered=True)
+    cube['day_name'] = pd.Categorical.from_codes(dates.dayofweek, preprocessor.DAYS, ordered=True)
+    cube['period'] = pd.Categorical.from_codes(hour, preprocessor.PERIODS, ordered=True)
+    return cube
+
+
+def _summarize(df):
+    # additive per-user aggregates: two chats' summaries merge by addition
+    counts = df.groupby(['users', 'only_date', 'hour'], observed=True).size()
+
+    totals = df.groupby('users', observed=True).agg(
+        messages=('message', 'size'),
+        words=('word_count', 'sum'),
+        media=('is_media', 'sum'),
+        links=('url_count', 'sum'),
+    ).astype('int64')
+
+    emojis = {}
+    for user, user_emojis in df.groupby('users', observed=True)['emojis']:
+        emojis[user] = Counter(itertools.chain.from_iterable(user_emojis))
+
+    return {'counts': counts, 'totals': totals, 'emojis': emojis}
+
+
+def _add_counts(a, b):
+    return pd.concat([a, b]).groupby(level=list(range(a.index.nlevels)), observed=True).sum()
+
+
+def _merge_summaries(old, new):
+    emojis = dict(old['emojis'])
+    for user, counts in new['emojis'].items():
+        emojis[user] = emojis.get(user, Counter()) + counts
+
+    return {
+        'counts': _add_counts(old['counts'], new['counts']),
+        'totals': _add_counts(old['totals'], new['totals']),
+        'emojis': emojis,
+    }
+
+
+def _attach_summary(df, summary):
+    counts = summary['counts']
+    cube = {'Overall': _cube_frame(counts.groupby(level=['only_date', 'hour']).sum())}
+    for user, user_counts in counts.groupby(level='users', observed=True):
+        cube[user] = _cube_frame(user_counts.droplevel('users'))
+
+    totals = summary['totals'].copy()
+    totals.loc['Overall'] = totals.sum()
+
+    emojis = dict(summary['emojis'])
+    emojis['Overall'] = sum(emojis.values(), Counter())
+
+    _attach(df, 'summary', summary)
+    _attach(df, 'cube', cube)
+    _attach(df, 'totals', totals)
+    _attach(df, 'emoji_counts', emojis)
+    # one scoring run per chat, even when both sentiment helpers ask at once
+    _attach(df, 'sentiment_lock', threading.Lock())
+
+
+@profiling.profiled
+def summarize_users(df):
+    """Aggregate the chat once per user for instant user switching.
+
+    Builds the (user x date x hour) message count cube, per-user totals
+    (messages, words, media, links) and emoji counters, with 'Overall' as
+    the sum over users. The activity helpers then read a small slice of the
+    cube instead of grouping the raw rows again. Expects a frame with the
+    PREPARED_FEATURES (see add_message_features)."""
+    _attach_summary(df, _summarize(df))
+    return df
+
+
+def _summarize_sentiment(df):
+    # sentiment classes per user and day, additive like _summarize
+    text = df[~df['is_media']]
+    polarity = text['polarity'] if 'polarity' in text.columns else _feature('polarity', text)
+    classes = _classify(polarity).rename('sentiment')
+    days = classes.groupby([text['users'], text['only_date'], classes], observed=True).size()
+    totals = days.groupby(level=['users', 'sentiment'], observed=True).sum().unstack(fill_value=0)
+    return {'totals': totals.reindex(columns=SENTIMENTS, fill_value=0), 'days': days}
+
+
+def _attach_sentiment(df, summary):
+    totals = summary['totals'].copy()
+    totals.loc['Overall'] = totals.sum()
+    _attach(df, 'sentiment', summary)
+    _attach(df, 'sentiment_totals', totals)
+
+
+@profiling.profiled
+def summarize_sentiment(df):
+    """Score a summarized chat's messages and count sentiment classes.
+
+    Per-user totals and classes per day, for sentiment_analysis and
+    sentiment_timeline. Not part of prepare_chat: scoring is the slowest
+    step of the analysis, so it runs the first time a sentiment helper
+    is called on the frame (and only once)."""
+    summary = _lookup(df, 'sentiment')
+    if summary is None:
+        # only callers asking for this same chat wait for its scoring
+        with _lookup(df, 'sentiment_lock'):
+            summary = _lookup(df, 'sentiment')
+            if summary is None:
+                _attach_sentiment(df, _summarize_sentiment(df))
+                summary = _lookup(df, 'sentiment')
+    return summary
+
+
+@profiling.profiled
+def prepare_chat(df, scheduler=None):
+    """Everything the dashboard needs from a parsed export, built once.
+
+    Drops group notifications, adds the message features, indexes the rows
+    by user and summarizes them. Sentiment is left to summarize_sentiment."""
+    df = df[df['users'] != 'group_notification']
+    df['users'] = df['users'].cat.remove_unused_categories()
+    # per-message features (words, media, links, emojis) are computed once
+    # here and shared by every analysis
+    df = add_message_features(df, PREPARED_FEATURES, scheduler=scheduler)
+    # rows grouped by user so per-user views are slices, not copies
+    df = index_users(df)
+    # per-user count cube and totals: switching users is a lookup
+    return summarize_users(df)
+
+
+@profiling.profiled
+def extend_chat(df, new_rows, scheduler=None):
+    """Append the messages of a newer export to a prepared chat.
+
+    `df` comes from prepare_chat (or an earlier extend_chat) and `new_rows`
+    from preprocessor.preprocess_tail. Features and aggregates are computed
+    for the new rows only and added to the stored ones (message counts,
+    totals, sentiment classes once scored, emoji and cached word counters),
+    so the cost follows the number of new messages rather than the chat's
+    history."""
+    summary = _lookup(df, 'summary')
+    if summary is None:
+        summary = _summarize(df)
+    sentiment_summary = _lookup(df, 'sentiment')
+
+    new_rows = new_rows[new_rows['users'] != 'group_notification']
+    if new_rows.empty:
+        return df
+    new_rows['users'] = new_rows['users'].cat.remove_unused_categories()
+    new_rows = add_message_features(new_rows, list(df.columns), scheduler=scheduler)
+    new_summary = _summarize(new_rows)
+
+    users = pd.api.types.union_categoricals([df['users'], new_rows['users']])
+    combined = pd.concat([df, new_rows[df.columns]], ignore_index=True)
+    combined['users'] = users
+    combined = index_users(combined)
+    _attach_summary(combined, _merge_summaries(summary, new_summary))
+    if sentiment_summary is not None:
+        # the old messages were scored already; only the new ones are
+        new_sentiment = _summarize_sentiment(new_rows)
+        _attach_sentiment(combined, {
+            'totals': _add_counts(sentiment_summary['totals'], new_sentiment['totals']),
+            'days': _add_counts(sentiment_summary['days'], new_sentiment['days']),
+        })
+
+    word_counts = _lookup(df, 'word_counts')
+    if word_counts:
+        merged = {}
+        for user, counter in word_counts.items():
+            rows = new_rows if user == 'Overall' else new_rows[new_rows['users'] == user]
+            merged[user] = counters.TopKCounter()
+            merged[user].update_counts(dict(counter.most_common()))
+            merged[user].update_counts(dict(_count_words(rows).most_common()))
+        _attach(combined, 'word_counts', merged)
+    return combined
+
+
+def _activity(selected_user, df):
+    """Message counts per (only_date, hour) with calendar columns.
+
+    Read from the cube when summarize_users ran on this frame, otherwise
+    aggregated from the user's rows."""
+    cube = _lookup(df, 'cube')
+    if cube is not None:
+        # a user without messages gets an empty frame of the same shape
+        return cube.get(selected_user, cube['Overall'].iloc[:0])
+
+    df = _select_user(selected_user, df)
+    return _cube_frame(df.groupby(['only_date', 'hour']).size())
+
+
+def _user_totals(selected_user, df):
+    totals = _lookup(df, 'totals')
+    if totals is None:
+        return None
+    if selected_user in totals.index:
+        return totals.loc[selected_user]
+    return pd.Series(0, index=totals.columns)
+
+
+SENTIMENTS = ['positive', 'neutral', 'negative']
+
+
+def _classify(polarity):
+    # positive > 0.1, negative < -0.1, neutral in between (bounds included)
+    codes = np.select([polarity > 0.1, polarity < -0.1], [0, 2], 1)
+    return pd.Series(pd.Categorical.from_codes(codes, SENTIMENTS), index=polarity.index)
+
+
+@profiling.profiled
 def fetch_statistics(selected_user, df):
 
-    if selected_user != 'Overall':
-        df= df[df['users'] == selected_user]
+    totals = _user_totals(selected_user, df)
+    if totals is not None:
+        return (int(totals['messages']), int(totals['words']),
+                int(totals['media']), int(totals['links']))
+
+    df = _select_user(selected_user, df)
+
+    # only the cheap columns are needed here, never the sentiment scores
+    df = _with_features(df, 'is_media', 'word_count', 'url_count')
 
     # total_msgs
     total_msgs = df.shape[0]
 
     # total words
-    words = []
-    for m in df['message']:
-        words.extend(m.split())
-
-    total_words = len(words)
-
+    total_words = int(df['word_count'].sum())
 
     # total media
-    # total_media = df[df['messages'] == "<Media omitted>\n"].shape[0]
-    total_media = df['message'].str.contains('Media omitted', na=False).sum()
+    total_media = int(df['is_media'].sum())
+
     # total links
-    extract = URLExtract()
-    links = []
-    for m in df['message']:
-        links.extend(extract.find_urls(m))
-    total_links = len(links)
+    total_links = int(df['url_count'].sum())
 
     return total_msgs, total_words,total_media, total_links
 
 
+@profiling.profiled
 def sentiment_analysis(selected_user, df):
     """Analyze sentiment of messages"""
-    if selected_user != 'Overall':
-        df = df[df['users'] == selected_user]
-
-    # Filter out group notifications and media messages
-
-    temp = df[df['message'] != '<Media omitted>\n']
-
-    sentiments = []
-    for message in temp['message']:
-        try:
-            # Analyze sentiment using TextBlob
-            analysis = TextBlob(message)
-            polarity = analysis.sentiment.polarity
-
-            # Classify sentiment
-            if polarity > 0.1:
-                sentiments.append('positive')
-            elif polarity < -0.1:
-                sentiments.append('negative')
-            else:
-                sentiments.append('neutral')
-        except:
-            sentiments.append('neutral')
+    if _lookup(df, 'summary') is not None:
+        summarize_sentiment(df)
+        totals = _lookup(df, 'sentiment_totals')
+        sentiment_counts = totals.loc[selected_user] if selected_user in totals.index else pd.Series(dtype='int64')
+    else:
+        df = _select_user(selected_user, df)
+
+        # Filter out media messages
+        df = _with_features(df, 'is_media', 'polarity')
+        temp = df[~df['is_media']]
+        sentiment_counts = _classify(temp['polarity']).value_counts()
 
     # Calculate percentages
-    sentiment_counts = Counter(sentiments)
-    total = len(sentiments)
+    total = int(sentiment_counts.sum())
 
     if total == 0:
         return {'positive': 0, 'neutral': 0, 'negative': 0}
 
     return {
-        'positive': (sentiment_counts['positive'] / total) * 100,
-        'neutral': (sentiment_counts['neutral'] / total) * 100,
-        'negative': (sentiment_counts['negative'] / total) * 100
+        'positive': float(sentiment_counts.get('positive', 0) / total * 100),
+        'neutral': float(sentiment_counts.get('neutral', 0) / total * 100),
+        'negative': float(sentiment_counts.get('negative', 0) / total * 100)
     }
 
-def sentiment_timeline(selected_user, df):
-    """Get sentiment trends over time"""
-    if selected_user != 'Overall':
-        df = df[df['users'] == selected_user]
-
-    # Filter out group notifications and media messages
-
-    temp = df[df['message'] != '<Media omitted>\n'].copy()
-
-    # Add sentiment column
-    sentiments = []
-    for message in temp['message']:
-        try:
-            analysis = TextBlob(message)
-            sentiments.append(analysis.sentiment.polarity)
-        except:
-            sentiments.append(0)
-
-    temp['sentiment'] = sentiments
-
-    # Group by date and calculate average sentiment
-    daily_sentiment = temp.groupby('only_date').agg({
-        'sentiment': lambda x: sum(1 for s in x if s > 0.1) / len(x) * 100 if len(x) > 0 else 0
-    }).reset_index()
-    daily_sentiment.columns = ['date', 'positive']
-
-    # Calculate neutral and negative
-    temp_grouped = temp.groupby('only_date')
-
-    neutral_pct = []
-    negative_pct = []
-
-    for date in daily_sentiment['date']:
-        date_messages = temp[temp['only_date'] == date]['sentiment']
-        total = len(date_messages)
-        if total > 0:
-            neutral = sum(1 for s in date_messages if -0.1 <= s <= 0.1) / total * 100
-            negative = sum(1 for s in date_messages if s < -0.1) / total * 100
+# resampling rules accepted by sentiment_timeline, finest first
+TIMELINE_FREQUENCIES = {'D': None, 'W': 'W', 'M': 'M', 'Q': 'Q', 'Y': 'Y'}
+# default point budget of the timelines ('auto' resolution, downsampling)
+TIMELINE_MAX_POINTS = 500
+
+
+def _timeline_frequency(dates, max_points):
+    """The finest of TIMELINE_FREQUENCIES giving at most `max_points` dates."""
+    days = pd.Series(dates.unique())
+    for freq, rule in TIMELINE_FREQUENCIES.items():
+        periods = days if rule is None else days.dt.to_period(rule)
+        if periods.nunique() <= max_points:
+            break
+    return freq
+
+
+@profiling.profiled
+def sentiment_timeline(selected_user, df, freq='D', max_points=TIMELINE_MAX_POINTS):
+    """Get sentiment trends over time
+
+    Percentages of positive/neutral/negative messages per day, or per week
+    ('W') / month ('M') / quarter ('Q') / year ('Y') to keep long timelines
+    small. 'auto' picks the finest of these with at most `max_points`
+    points by the chat's date span; the chosen one is in attrs['freq']."""
+    if freq not in TIMELINE_FREQUENCIES and freq != 'auto':
+        raise ValueError(f"freq must be 'auto' or one of {list(TIMELINE_FREQUENCIES)}, got {freq!r}")
+
+    if _lookup(df, 'summary') is not None:
+        # sentiment classes per day, counted once by summarize_sentiment
+        days = summarize_sentiment(df)['days']
+        if selected_user == 'Overall':
+            days = days.groupby(level=['only_date', 'sentiment'], observed=True).sum()
         else:
-            neutral = 0
-            negative = 0
-        neutral_pct.append(neutral)
-        negative_pct.append(negative)
-
-    daily_sentiment['neutral'] = neutral_pct
-    daily_sentiment['negative'] = negative_pct
+            days = days[days.index.get_level_values('users') == selected_user].droplevel('users')
+        counts = days.unstack('sentiment', fill_value=0)
+
+        dates = counts.index.to_series()
+        if freq == 'auto':
+            freq = _timeline_frequency(dates, max_points)
+        if TIMELINE_FREQUENCIES[freq]:
+            counts = counts.groupby(dates.dt.to_period(TIMELINE_FREQUENCIES[freq]).dt.start_time).sum()
+        daily_sentiment = counts.div(counts.sum(axis=1), axis=0) * 100
+    else:
+        df = _select_user(selected_user, df)
+
+        # Filter out media messages
+        df = _with_features(df, 'is_media', 'polarity')
+        temp = df[~df['is_media']]
+
+        dates = temp['only_date']
+        if freq == 'auto':
+            freq = _timeline_frequency(dates, max_points)
+        if TIMELINE_FREQUENCIES[freq]:
+            dates = dates.dt.to_period(TIMELINE_FREQUENCIES[freq]).dt.start_time
+
+        # one pass: count each sentiment class per date, as row percentages
+        daily_sentiment = pd.crosstab(dates, _classify(temp['polarity']), normalize='index') * 100
+
+    daily_sentiment = daily_sentiment.reindex(columns=SENTIMENTS, fill_value=0)
+    daily_sentiment = daily_sentiment.rename_axis(index='date', columns=None).reset_index()
+    daily_sentiment.attrs['freq'] = freq
 
     return daily_sentiment
 
@@ -134,6 +518,7 @@ def sentiment_timeline(selected_user, df):
 #     return x, df_percent
 
 
+@profiling.profiled
 def most_busy_users(df):
 
     user_counts = df['users'].value_counts()
@@ -149,123 +534,233 @@ def most_busy_users(df):
     return  top_users, percent_df
 
 
-def create_wordcloud(selected_user , df):
+# word lists live next to this module as stop_<language>.txt
+STOP_WORDS_DIR = os.path.dirname(os.path.abspath(__file__))
+STOP_WORD_LANGUAGES = ('hinglish',)
 
-    try:
-        with open('stop_hinglish.txt' , 'r') as f:
-            stop_words = set(f.read().split())
 
-    except FileNotFoundError:
-        stop_words = set()
+@functools.lru_cache(maxsize=None)
+def load_stop_words(languages=STOP_WORD_LANGUAGES):
+    """Stop words of the given languages, read once per process.
 
+    Each language is a whitespace-separated list in stop_<language>.txt;
+    missing lists are skipped with a warning."""
+    words = set()
+    for language in languages:
+        path = os.path.join(STOP_WORDS_DIR, f'stop_{language}.txt')
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                words.update(f.read().split())
+        except FileNotFoundError:
+            logger.warning("stop word list %s not found", path)
+    return frozenset(words)
+
+
+# canvas settings per quality tier; 'full' is 4800x2400 pixels, 'preview'
+# renders a quarter of the canvas at scale 1 (36x fewer pixels)
+WORDCLOUD_QUALITY = {
+    'preview': dict(width=800, height=400, scale=1, min_font_size=15, max_font_size=175),
+    'full': dict(width=1600, height=800, scale=3, min_font_size=30, max_font_size=350),
+}
+WORDCLOUD_MAX_WORDS = 200
+WORDCLOUD_TOKEN = re.compile(r"\w[\w']+")
+
+
+def _count_words(df):
+    df = _with_features(df, 'is_media')
+    return counters.count_words(df.loc[~df['is_media'], 'message'])
+
+
+# guards creating a frame's word counts and their lock; counting itself
+# holds only that frame's lock
+_word_counts_lock = threading.Lock()
+
+
+def _word_counts(selected_user, df):
+    """Exact counts of every lower-cased word of a user, stop words included.
+
+    Counted once per frame and user, then shared by the word cloud and the
+    common-words table (stop words are dropped when reading) and carried
+    over to the extended frame by extend_chat."""
+    word_counts = _lookup(df, 'word_counts')
+    counter = word_counts.get(selected_user) if word_counts is not None else None
+    if counter is not None:
+        return counter
+
+    with _word_counts_lock:
+        word_counts = _lookup(df, 'word_counts')
+        if word_counts is None:
+            word_counts = {}
+            _attach(df, 'word_counts', word_counts)
+        lock = _lookup(df, 'word_counts_lock')
+        if lock is None:
+            lock = threading.Lock()
+            _attach(df, 'word_counts_lock', lock)
+
+    # the word cloud and the table of a chat are computed on concurrent
+    # threads; they count its words once
+    with lock:
+        counter = word_counts.get(selected_user)
+        if counter is None:
+            counter = word_counts[selected_user] = _count_words(_select_user(selected_user, df))
+        return counter
+
+
+@profiling.profiled
+def word_frequencies(selected_user, df, languages=STOP_WORD_LANGUAGES):
+    """Word counts as WordCloud.generate() would tokenize them.
+
+    WordCloud's token rules (words of 2+ characters, no numbers, "'s"
+    stripped, its English stop words) are applied per distinct word of
+    the user's word counts instead of per token, so WordCloud never
+    re-tokenizes the text."""
+    from wordcloud import STOPWORDS
+
+    stop_words = load_stop_words(languages) | STOPWORDS
+
+    frequencies = Counter()
+    for word, count in _word_counts(selected_user, df).most_common():
+        if word in stop_words:
+            continue
+        for token in WORDCLOUD_TOKEN.findall(word):
+            if token.endswith("'s"):
+                token = token[:-2]
+            if token and not token.isdigit() and token not in stop_words:
+                frequencies[token] += count
+    return frequencies
+
+
+def _layout_wordcloud(frequencies, quality):
+    from wordcloud import WordCloud
+
+    wc = WordCloud(**WORDCLOUD_QUALITY[quality],
+                   max_words=WORDCLOUD_MAX_WORDS,
+                   background_color='white',
+                   collocations=False)
 
-    if selected_user != 'Overall':
-        df = df[df['users'] == selected_user]
+    return wc.generate_from_frequencies(dict(Counter(frequencies).most_common(WORDCLOUD_MAX_WORDS)))
 
-    temp = df[df['message'] != '<Media omitted>\n'].copy()
 
-    def remove_stop_words(message):
-        y = []
-        for w in message.lower().split():
-            if w not in stop_words:
-                y.append(w)
-        return ' '.join(y)
+@profiling.profiled
+def create_wordcloud(selected_user , df, languages=STOP_WORD_LANGUAGES, quality='full'):
 
-    wc = WordCloud(width = 1600 ,
-                   height=800 ,
-                   min_font_size=30 ,
-                   max_font_size=350,
-                   max_words=200,
-                   background_color='white',
-                   scale = 3,
-                   collocations=False)
+    return _layout_wordcloud(word_frequencies(selected_user, df, languages), quality)
 
-    temp = temp.copy()
-    temp['message'] = temp['message'].apply(remove_stop_words)
-    text = temp['message'].str.cat(sep = ' ')
 
-    return  wc.generate(text)
+@profiling.profiled
+def render_wordcloud(frequencies, quality='full'):
+    """The word cloud of `frequencies` as a PNG data URI for a Plotly layout image.
 
+    Encoding once here keeps the cached value small (PNG instead of raw
+    pixels) and saves Plotly from encoding the image on every rerun. Only
+    the top words are needed, so this is cheap to send to a worker process."""
+    buffer = io.BytesIO()
+    _layout_wordcloud(frequencies, quality).to_image().save(buffer, format='PNG')
+    return 'data:image/png;base64,' + base64.b64encode(buffer.getvalue()).decode('ascii')
 
 
-def most_common_words(selected_user, df):
-    try:
-        f = open('stop_hinglish.txt', 'r')
-        stop_words = f.read()
-        f.close()
-    except FileNotFoundError:
-        stop_words = ""
+@profiling.profiled
+def wordcloud_uri(selected_user, df, languages=STOP_WORD_LANGUAGES, quality='full'):
+    return render_wordcloud(word_frequencies(selected_user, df, languages), quality)
 
-    if selected_user != 'Overall':
-        df = df[df['users'] == selected_user]
 
 
-    temp = df[df['message'] != '<Media omitted>\n']
+@profiling.profiled
+def most_common_words(selected_user, df, languages=STOP_WORD_LANGUAGES, approximate=False):
+    """Top 20 words; `approximate` bounds memory with a Space-Saving counter."""
+    stop_words = load_stop_words(languages)
+    if approximate:
+        df = _select_user(selected_user, df)
 
-    words = []
-    for message in temp['message']:
-        for word in message.lower().split():
-            if word not in stop_words:
-                words.append(word)
+        df = _with_features(df, 'is_media')
+        counter = counters.count_words(df.loc[~df['is_media'], 'message'], stop_words,
+                                       capacity=counters.TOP_K_CAPACITY)
+        top = counter.most_common(20)
+    else:
+        words = ((word, count) for word, count in _word_counts(selected_user, df).most_common()
+                 if word not in stop_words)
+        top = list(itertools.islice(words, 20))
 
-    most_common_df = pd.DataFrame(Counter(words).most_common(20))
+    most_common_df = pd.DataFrame(top, columns=[0, 1])
     return most_common_df
 
 
-def emoji_helper(selected_user, df):
-    if selected_user != 'Overall':
-        df = df[df['users'] == selected_user]
+@profiling.profiled
+def emoji_helper(selected_user, df, approximate=False):
+    emoji_counts = _lookup(df, 'emoji_counts')
+    if emoji_counts is not None:
+        emoji_counts = emoji_counts.get(selected_user, Counter())
+    else:
+        df = _select_user(selected_user, df)
 
-    emojis = []
-    for message in df['message']:
-        emojis.extend([c for c in message if c in emoji.EMOJI_DATA])
+        df = _with_features(df, 'emojis')
+        emoji_counts = counters.count_items(df['emojis'],
+                                            capacity=counters.TOP_K_CAPACITY if approximate else None)
 
-    if len(emojis) == 0:
+    if len(emoji_counts) == 0:
         return pd.DataFrame()
 
-    emoji_df = pd.DataFrame(Counter(emojis).most_common(len(Counter(emojis))))
+    emoji_df = pd.DataFrame(emoji_counts.most_common())
     return emoji_df
 
 
+@profiling.profiled
 def monthly_timeline(selected_user, df):
-    if selected_user != 'Overall':
-        df = df[df['users'] == selected_user]
-
-    timeline = df.groupby(['year', 'month_no', 'month']).count()['message'].reset_index()
+    activity = _activity(selected_user, df)
 
-    time = []
-    for i in range(timeline.shape[0]):
-        time.append(timeline['month'][i] + "-" + str(timeline['year'][i]))
+    timeline = (activity.groupby(['year', 'month_no', 'month'], observed=True)['count'].sum()
+                .rename('message').reset_index())
 
-    timeline['time'] = time
+    timeline['time'] = timeline['month'].astype(str) + "-" + timeline['year'].astype(str)
     return timeline
 
 
-def daily_timeline(selected_user, df):
-    if selected_user != 'Overall':
-        df = df[df['users'] == selected_user]
+@profiling.profiled
+def daily_timeline(selected_user, df, max_points=None):
+    """Messages per day; with `max_points`, LTTB keeps that many of the days."""
+    activity = _activity(selected_user, df)
 
-    daily_timeline1 = df.groupby('only_date').count()['message'].reset_index()
+    daily_timeline1 = activity.groupby('only_date')['count'].sum().rename('message').reset_index()
+    if max_points and len(daily_timeline1) > max_points:
+        keep = downsample.lttb(daily_timeline1['only_date'].to_numpy().astype('int64'),
+                               daily_timeline1['message'].to_numpy(), max_points)
+        daily_timeline1 = daily_timeline1.iloc[keep].reset_index(drop=True)
     return daily_timeline1
 
 
+@profiling.profiled
 def week_activity_map(selected_user, df):
-    if selected_user != 'Overall':
-        df = df[df['users'] == selected_user]
+    activity = _activity(selected_user, df)
 
-    return df['day_name'].value_counts()
+    counts = activity.groupby('day_name', observed=True)['count'].sum().sort_values(ascending=False)
+    return counts[counts > 0]
 
 
+@profiling.profiled
 def month_activity_map(selected_user, df):
-    if selected_user != 'Overall':
-        df = df[df['users'] == selected_user]
+    activity = _activity(selected_user, df)
 
-    return df['month'].value_counts()
+    counts = activity.groupby('month', observed=True)['count'].sum().sort_values(ascending=False)
+    return counts[counts > 0]
 
 
+@profiling.profiled
 def activity_heatmap(selected_user, df):
-    if selected_user != 'Overall':
-        df = df[df['users'] == selected_user]
+    activity = _activity(selected_user, df)
+
+    user_heatmap = activity.pivot_table(index='day_name', columns='period', values='count', aggfunc='sum',
+                                        observed=True).fillna(0)
+    return user_heatmap
+
+
+def warm_up():
+    """Load the analysis libraries and their data before the first upload.
 
-    user_heatmap = df.pivot_table(index='day_name', columns='period', values='message', aggfunc='count').fillna(0)
-    return user_heatmap
\ No newline at end of file
+    URLExtract, WordCloud, the emoji table and the sentiment backend are
+    loaded on first use so the app starts quickly; running this in the
+    background meanwhile keeps that cost out of the first analysis."""
+    url_extractor()
+    emoji_scan.find_emojis(pd.Series(['👍']))
+    load_stop_words()
+    import wordcloud  # noqa: F401  (pulls in matplotlib/PIL)
+    sentiment.engine.score(['good'])
@@ -1,68 +1,419 @@
+import codecs
+import io
+import itertools
+import os
 import re
 import pandas as pd
 
+import profiling
 
-def preprocess(data):
-    pattern = r'\d{1,2}/\d{1,2}/\d{2,4},\s\d{1,2}:\d{2}\s-\s'
 
-    messages = re.split(pattern, data)[1:]
-    dates = re.findall(pattern, data)
+# Bump whenever the output of preprocess changes; persisted parse results of
+# other versions are discarded (see cache.DiskCache).
+PARSER_VERSION = 3
 
-    df = pd.DataFrame({'message': messages, 'date': dates})
+# Registry of export variants. Each entry describes how a message line
+# starts and which strftime formats its timestamp may use; detect_format()
+# picks one entry and one date format from a small sample of the file, so
+# the full export is only parsed once.
+FORMATS = []
 
-    # convert message_date type
-    formats = [
-        '%d/%m/%y, %H:%M - ',
-        '%d/%m/%y, %I:%M %p - '
-    ]
+SAMPLE_SIZE = 16 * 1024   # characters inspected by detect_format()
 
 
-    flag = False
-    for fmt in formats:
-        try:
-            df['date'] = pd.to_datetime(df['date'], format = fmt)
-            flag = True
+def register_format(name, header, date_formats):
+    """Register an export variant.
+
+    `header` matches the start of a message line (without the author) and
+    must have exactly one capturing group around the timestamp;
+    `date_formats` lists the formats that timestamp may be written in, most
+    likely first. Narrow/no-break spaces in timestamps are normalized to
+    plain spaces before parsing."""
+    if re.compile(header).groups != 1:
+        raise ValueError(f"header of format {name!r} must capture exactly the timestamp")
+
+    # a message starts at the beginning of a line with a timestamp, optionally
+    # followed by "author: " (group notifications have no author); everything
+    # up to the next timestamped line (continuation lines included) is the
+    # body. The author stops at the first ": " of the header line, so colons
+    # inside the body are kept.
+    # groups: full header, timestamp, author
+    message_start = re.compile('^(' + header + r'(?:([^\n]+?): )?)', re.MULTILINE)
+
+    FORMATS.append({
+        'name': name,
+        'header': re.compile('^' + header, re.MULTILINE),
+        'message_start': message_start,
+        'date_formats': list(date_formats),
+    })
+
+
+def _date_formats(date_orders, separator=', '):
+    times = ['%H:%M', '%H:%M:%S', '%I:%M %p', '%I:%M:%S %p']
+    return [order + separator + time for order in date_orders for time in times]
+
+
+def _timestamp(sep):
+    return (r'\d{1,2}' + sep + r'\d{1,2}' + sep + r'\d{2,4},\s'
+            r'\d{1,2}:\d{2}(?::\d{2})?(?:\s[AaPp][Mm])?')
+
+# Android: "12/01/23, 21:05 - " / "12/01/23, 9:05\u202fpm - " (day or month first)
+register_format(
+    'android',
+    '(' + _timestamp('/') + r')\s-\s',
+    _date_formats(['%d/%m/%y', '%d/%m/%Y', '%m/%d/%y', '%m/%d/%Y']),
+)
+
+# iOS: "[12/01/2023, 21:05:33] " (media lines start with a left-to-right mark)
+register_format(
+    'ios',
+    '\u200e?\\[(' + _timestamp('/') + r')\]\s',
+    _date_formats(['%d/%m/%Y', '%d/%m/%y', '%m/%d/%Y', '%m/%d/%y']),
+)
+
+# Android in dotted locales (de, ru, ...): "12.01.23, 21:05 - "
+register_format(
+    'android_dotted',
+    '(' + _timestamp(r'\.') + r')\s-\s',
+    _date_formats(['%d.%m.%y', '%d.%m.%Y']),
+)
+
+
+MONTHS = ['January', 'February', 'March', 'April', 'May', 'June', 'July',
+          'August', 'September', 'October', 'November', 'December']
+DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+# hour of day -> '00-1', '1-2', ..., '22-23', '23-00'
+PERIODS = ['00-1'] + [f'{hour}-{hour + 1}' for hour in range(1, 23)] + ['23-00']
+
+CHUNK_SIZE = 1 << 20    # characters (or bytes) read from the source at a time
+BATCH_SIZE = 50_000     # messages per intermediate DataFrame
+
+BOM = '\ufeff'
+
+
+def _read_chunks(data, chunk_size):
+    """Yield the export as text chunks without holding it all in memory.
+
+    `data` may be the decoded text, raw bytes, an os.PathLike path (e.g. a
+    pathlib.Path; a plain str is always the text itself, never a path) or
+    any text/binary file-like object (e.g. a Streamlit upload or a zip
+    member). Bytes are decoded incrementally; a leading BOM is dropped and
+    invalid UTF-8 sequences become U+FFFD instead of failing the whole upload."""
+    if isinstance(data, str):
+        data = data[1:] if data.startswith(BOM) else data
+        for start in range(0, len(data), chunk_size):
+            yield data[start:start + chunk_size]
+        return
+
+    if isinstance(data, (bytes, bytearray)):
+        data = io.BytesIO(data)
+    elif isinstance(data, os.PathLike):
+        with open(data, 'rb') as f:
+            yield from _read_chunks(f, chunk_size)
+        return
+
+    decoder = codecs.getincrementaldecoder('utf-8-sig')(errors='replace')
+    first = True
+    while True:
+        chunk = data.read(chunk_size)
+        if not chunk:
             break
+        if isinstance(chunk, bytes):
+            chunk = decoder.decode(chunk)
+        elif first and chunk.startswith(BOM):
+            chunk = chunk[1:]
+        if chunk:
+            first = False
+            yield chunk
+
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+
+def _iter_messages(chunks, message_start):
+    """Yield (dates, users, messages) lists for every complete message per chunk.
+
+    The last message of a chunk may continue on the next lines, so it is
+    carried over and only emitted once the next timestamp (or EOF) is seen."""
+    carry = ''
+    for chunk in chunks:
+        buffer = carry + chunk
+        cut = buffer.rfind('\n') + 1
+        head, tail = buffer[:cut], buffer[cut:]
+
+        # one pass over the buffer pulls out all fields:
+        # ['text before first timestamp', header, date, user, message, header, ...]
+        parts = message_start.split(head)
+        if len(parts) > 5:
+            yield parts[2:-4:4], parts[3:-4:4], parts[4:-4:4]
+        carry = parts[-4] + parts[-1] if len(parts) > 1 else ''
+        carry += tail
+
+    parts = message_start.split(carry)
+    if len(parts) > 1:
+        yield parts[2::4], parts[3::4], parts[4::4]
+
+
+def _peek(chunks, size):
+    """Read at least `size` characters (or everything) from `chunks`.
+
+    Returns the sample and an iterator that still yields the whole text."""
+    sample = []
+    length = 0
+    for chunk in chunks:
+        sample.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            break
+
+    sample = ''.join(sample)
+    return sample, itertools.chain([sample], chunks)
+
+
+def _normalize_dates(dates):
+    # iOS and newer Android exports put a narrow no-break space before AM/PM
+    return (pd.Series(dates, dtype=object)
+            .str.replace('\u202f', ' ', regex=False)
+            .str.replace('\xa0', ' ', regex=False))
+
+
+def detect_format(sample):
+    """Pick the registered format and date format used by an export.
+
+    `sample` is the beginning of the export. The format whose header matches
+    the most lines wins; its date formats are tried on the sampled timestamps
+    only, preferring one that reads them in chronological order (this is what
+    separates day-first from month-first exports). If several do, e.g. when
+    no day in the sample is past the 12th, the one giving the shortest time
+    span wins: a week of messages read the wrong way round spreads over
+    months."""
+    counts = [len(chat_format['header'].findall(sample)) for chat_format in FORMATS]
+    if not counts or max(counts) == 0:
+        raise ValueError("Unsupported WhatsApp timestamp format")
+
+    chat_format = FORMATS[counts.index(max(counts))]
+    dates = _normalize_dates(chat_format['header'].findall(sample))
+
+    parsed = []
+    for fmt in chat_format['date_formats']:
+        try:
+            parsed.append((fmt, pd.to_datetime(dates, format=fmt)))
+        except ValueError:
+            pass
+
+    if not parsed:
+        raise ValueError("Unsupported WhatsApp timestamp format")
+
+    def rank(candidate):
+        values = candidate[1]
+        return not values.is_monotonic_increasing, values.max() - values.min()
+
+    # min() keeps the first of equally ranked formats
+    return chat_format, min(parsed, key=rank)[0]
+
+
+def _parse_dates(dates, chat_format, fmt):
+    # the detected format normally parses every batch on the first try; the
+    # other candidates are only tried for a batch the sample did not predict
+    dates = _normalize_dates(dates)
+    candidates = [fmt] + [f for f in chat_format['date_formats'] if f != fmt]
+    for candidate in candidates:
+        try:
+            return pd.to_datetime(dates, format=candidate), candidate
         except ValueError:
             pass
 
-    if not flag:
+    raise ValueError("Unsupported WhatsApp timestamp format")
+
+
+def _day_first(fmt):
+    return fmt.index('%d') < fmt.index('%m')
+
+
+def _swap_day_month(fmt):
+    return fmt.replace('%d', '\0').replace('%m', '%d').replace('\0', '%m')
+
+
+def _reread_dates(batches, fmt):
+    """Read the dates of earlier batches (parsed with `fmt`) with day and month swapped.
+
+    Used when a later batch only parses the other way round (its sample had
+    no day past the 12th), so one export never mixes both readings. Raises
+    ValueError if an earlier batch cannot be read that way."""
+    swapped = _swap_day_month(fmt)
+    for batch in batches:
+        try:
+            batch['date'] = pd.to_datetime(batch['date'].dt.strftime(fmt), format=swapped)
+        except ValueError:
+            raise ValueError("The export has dates that only parse day-first and others "
+                             "that only parse month-first") from None
+
+
+def _build_batch(dates, users, messages, chat_format, fmt):
+    # str even when empty (an export that adds no messages)
+    df = pd.DataFrame({'message': pd.Series(messages, dtype='str')})
+    df['date'], fmt = _parse_dates(dates, chat_format, fmt)
+    df['users'] = pd.Series(users, dtype=object).fillna('group_notification')
+    return df, fmt
+
+
+def _add_calendar_columns(df):
+    """Derive the calendar columns from 'date' without per-row Python work.
+
+    Repeated labels (users, month, day_name, period) are stored as
+    Categoricals and the numeric fields as the smallest integer type, which
+    keeps them a few bytes per row instead of one string object each."""
+    dt = df['date'].dt
+    month_no = dt.month.astype('int8')
+    hour = dt.hour.astype('int8')
+
+    users = df['users'].astype('category')
+    names = users.cat.categories.str.strip().str.replace(r'\s+', ' ', regex=True)
+    unique_names = pd.Index(names.unique())
+    df['users'] = pd.Categorical.from_codes(
+        unique_names.get_indexer(names)[users.cat.codes], unique_names)
+
+    df['only_date'] = dt.normalize()
+    df['year'] = dt.year.astype('int16')
+    df['month_no'] = month_no
+    df['month'] = pd.Categorical.from_codes(month_no - 1, MONTHS, ordered=True)
+    df['day'] = dt.day.astype('int8')
+    df['day_name'] = pd.Categorical.from_codes(dt.dayofweek, DAYS, ordered=True)
+    df['hour'] = hour
+    df['minute'] = dt.minute.astype('int8')
+    df['period'] = pd.Categorical.from_codes(hour, PERIODS, ordered=True)
+
+
+def _sniff(archive, info):
+    # only the head of the entry is decompressed
+    with archive.open(info) as f:
+        sample = ''.join(_read_chunks(io.BytesIO(f.read(SAMPLE_SIZE)), SAMPLE_SIZE))
+    try:
+        detect_format(sample)
+    except ValueError:
+        return False
+    return True
+
+
+def chat_member(archive):
+    """Pick the chat transcript of a zipped export.
+
+    Exports may carry attached media and, when several chats were zipped
+    together, more than one .txt. Only .txt entries are considered (media
+    is never read); names WhatsApp gives the transcript ("_chat.txt" on
+    iOS, "WhatsApp Chat ..." on Android) and then larger files are tried
+    first, and the first whose head parses as a chat wins."""
+    candidates = [info for info in archive.infolist()
+                  if not info.is_dir() and info.filename.lower().endswith('.txt')
+                  and not info.filename.startswith('__MACOSX/')
+                  and not os.path.basename(info.filename).startswith('._')]
+    if not candidates:
+        raise ValueError("No chat .txt file found inside ZIP")
+
+    def rank(info):
+        name = os.path.basename(info.filename).lower()
+        whatsapp = name == '_chat.txt' or name.startswith('whatsapp chat')
+        return not whatsapp, -info.file_size
+
+    for info in sorted(candidates, key=rank):
+        if _sniff(archive, info):
+            return info
+    raise ValueError("No .txt file inside ZIP looks like a WhatsApp chat")
+
+
+def _parse(chunks, chat_format, fmt, batch_size):
+    batches = []
+    dates, users, messages = [], [], []
+
+    # the split time includes reading and decoding the chunks
+    split = profiling.timed_iter('preprocess.split', _iter_messages(chunks, chat_format['message_start']))
+    for chunk_dates, chunk_users, chunk_messages in split:
+        dates.extend(chunk_dates)
+        users.extend(chunk_users)
+        messages.extend(chunk_messages)
+        while len(dates) >= batch_size:
+            with profiling.timed('preprocess.batch', rows=batch_size):
+                batch, batch_fmt = _build_batch(dates[:batch_size], users[:batch_size],
+                                                messages[:batch_size], chat_format, fmt)
+            if batches and _day_first(batch_fmt) != _day_first(fmt):
+                _reread_dates(batches, fmt)
+            fmt = batch_fmt
+            batches.append(batch)
+            del dates[:batch_size], users[:batch_size], messages[:batch_size]
+
+    if dates or not batches:
+        with profiling.timed('preprocess.batch', rows=len(dates)):
+            batch, batch_fmt = _build_batch(dates, users, messages, chat_format, fmt)
+        if batches and _day_first(batch_fmt) != _day_first(fmt):
+            _reread_dates(batches, fmt)
+        fmt = batch_fmt
+        batches.append(batch)
+
+    df = pd.concat(batches, ignore_index=True) if len(batches) > 1 else batches[0]
+
+    with profiling.timed('preprocess.calendar', rows=len(df)):
+        _add_calendar_columns(df)
+
+    # recorded so a newer export of the same chat can be parsed the same way
+    # (see preprocess_tail)
+    df.attrs['chat_format'] = chat_format['name']
+    df.attrs['date_format'] = fmt
+    return df
+
+
+def preprocess(data, batch_size=BATCH_SIZE, chunk_size=CHUNK_SIZE):
+    """Parse a WhatsApp export into one row per message.
+
+    The export is streamed in `chunk_size` pieces and converted to
+    DataFrames of at most `batch_size` messages, so peak memory depends on
+    the batch size instead of holding the raw text several times over."""
+    with profiling.timed('preprocess') as info:
+        chunks = profiling.timed_iter('preprocess.decode', _read_chunks(data, chunk_size))
+        sample, chunks = _peek(chunks, SAMPLE_SIZE)
+        with profiling.timed('preprocess.detect'):
+            chat_format, fmt = detect_format(sample[:SAMPLE_SIZE])
+
+        df = _parse(chunks, chat_format, fmt, batch_size)
+        info['rows'] = len(df)
+    return df
+
+
+def preprocess_tail(data, chat_format, date_format, batch_size=BATCH_SIZE, chunk_size=CHUNK_SIZE):
+    """Parse the messages a newer export appends to an already parsed one.
+
+    `data` is the new export from the end of the old one on; `chat_format`
+    and `date_format` are the old frame's attrs, so a short tail is never
+    re-detected with a different day/month order. Raises ValueError if the
+    tail does not start with a new message (the old export ended mid-message)."""
+    chat_format = next((f for f in FORMATS if f['name'] == chat_format), None)
+    if chat_format is None:
         raise ValueError("Unsupported WhatsApp timestamp format")
 
-    df.rename(columns={'message_date': 'date'}, inplace=True)
-
-    users = []
-    messages = []
-    for message in df['message']:
-        entry = re.split(r'([\w\W]+?):\s', message)
-        if entry[1:]:  # user name
-            users.append(entry[1])
-            messages.append(" ".join(entry[2:]))
-        else:
-            users.append('group_notification')
-            messages.append(entry[0])
-
-    df['users'] = users
-    df['message'] = messages
-
-    df['only_date'] = df['date'].dt.date
-    df['year'] = df['date'].dt.year
-    df['month_no'] = df['date'].dt.month
-    df['month'] = df['date'].dt.month_name()
-    df['day'] = df['date'].dt.day
-    df['day_name'] = df['date'].dt.day_name()
-    df['hour'] = df['date'].dt.hour
-    df['minute'] = df['date'].dt.minute
-
-    period = []
-    for hour in df[['day_name', 'hour']]['hour']:
-        if hour == 23:
-            period.append(str(hour) + "-" + str('00'))
-        elif hour == 0:
-            period.append(str('00') + "-" + str(hour + 1))
-        else:
-            period.append(str(hour) + "-" + str(hour + 1))
-
-    df['period'] = period
-
-    return df
\ No newline at end of file
+    with profiling.timed('preprocess_tail') as info:
+        chunks = profiling.timed_iter('preprocess.decode', _read_chunks(data, chunk_size))
+        sample, chunks = _peek(chunks, SAMPLE_SIZE)
+        head = sample.lstrip('\r\n')
+        if head and not chat_format['header'].match(head):
+            raise ValueError("The new export does not continue the previous one at a message boundary")
+
+        df = _parse(chunks, chat_format, date_format, batch_size)
+        if _day_first(df.attrs['date_format']) != _day_first(date_format):
+            # the stored messages were read the other way round
+            raise ValueError("The new export's dates do not parse like the previous one's")
+        info['rows'] = len(df)
+    return df
+
+
+def append_messages(df, tail):
+    """A parsed export followed by the rows preprocess_tail parsed from its successor.
+
+    Gives the frame preprocess would return for the newer export, without
+    parsing it again."""
+    if tail.empty:
+        return df
+    users = pd.api.types.union_categoricals([df['users'], tail['users']])
+    combined = pd.concat([df, tail[df.columns]], ignore_index=True)
+    combined['users'] = users
+    combined.attrs = dict(df.attrs)
+    return combined
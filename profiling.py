@@ -0,0 +1,172 @@
+import contextlib
+import contextvars
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:   # Windows
+    resource = None
+
+
+# one JSON object per timed stage, for log-based monitoring; PROFILE_LOG=1
+# writes them to stderr even where logging is not configured (Streamlit)
+logger = logging.getLogger('profiling')
+if os.environ.get('PROFILE_LOG', '').lower() in ('1', 'true', 'yes') and not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter('%(asctime)s %(name)s %(message)s'))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+# the records of the current dashboard run (see collect); worker threads of
+# scheduler.Scheduler inherit it from the thread that submitted the task
+_records = contextvars.ContextVar('profiling_records', default=None)
+
+# PROFILE_MEMORY=1 traces Python/NumPy allocations, so every stage also
+# reports its peak memory (this slows allocation-heavy code down noticeably)
+if os.environ.get('PROFILE_MEMORY', '').lower() in ('1', 'true', 'yes'):
+    tracemalloc.start()
+
+# stages currently running: tracemalloc has a single peak counter, so before
+# it is reset the peak so far is credited to every open stage
+_open = []
+_memory_lock = threading.Lock()
+
+
+def _memory_enter():
+    if not tracemalloc.is_tracing():
+        return None
+    with _memory_lock:
+        current, peak = tracemalloc.get_traced_memory()
+        for stage in _open:
+            stage['peak'] = max(stage['peak'], peak)
+        tracemalloc.reset_peak()
+        stage = {'base': current, 'peak': current}
+        _open.append(stage)
+        return stage
+
+
+def _memory_exit(stage):
+    if stage is None or not tracemalloc.is_tracing():
+        return None
+    with _memory_lock:
+        peak = tracemalloc.get_traced_memory()[1]
+        for other in _open:
+            other['peak'] = max(other['peak'], peak)
+        _open.remove(stage)
+    return (stage['peak'] - stage['base']) / 1e6
+
+
+def max_rss_mb():
+    """Peak resident memory of this process so far (None where unsupported)."""
+    if resource is None:
+        return None
+    # kilobytes on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1e6 if sys.platform == 'darwin' else rss / 1e3
+
+
+def record(stage, seconds, rows=None, peak_mb=None, **fields):
+    """Log a timing and add it to the current run's records."""
+    entry = {'stage': stage, 'seconds': round(seconds, 6), 'rows': rows, 'peak_mb': peak_mb, **fields}
+    records = _records.get()
+    if records is not None:
+        records.append(entry)
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps(entry, default=str, ensure_ascii=False))
+    return entry
+
+
+@contextlib.contextmanager
+def timed(stage, rows=None, **fields):
+    """Time the block as `stage`.
+
+    Yields a dict whose 'rows' (and other keys) may be set inside the block,
+    e.g. once the number of parsed messages is known. Stages nest: a
+    stage's time and peak include its sub-stages (and, for peak memory,
+    whatever ran concurrently)."""
+    info = {'rows': rows, **fields}
+    memory = _memory_enter()
+    start = time.perf_counter()
+    try:
+        yield info
+    finally:
+        seconds = time.perf_counter() - start
+        record(stage, seconds, peak_mb=_memory_exit(memory), **info)
+
+
+def timed_iter(stage, iterable):
+    """Yield from `iterable`, recording the time spent producing its items."""
+    seconds = 0.0
+    items = 0
+    iterator = iter(iterable)
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                break
+            finally:
+                seconds += time.perf_counter() - start
+            items += 1
+            yield item
+    finally:
+        record(stage, seconds, items=items)
+
+
+def profiled(fn):
+    """Record every call of a helper as 'helper.<name>'.
+
+    Rows are the length of the first DataFrame argument; a leading string
+    argument (the selected user) is recorded as 'user'."""
+    stage = f"{fn.__module__}.{fn.__name__}"
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        rows = next((len(arg) for arg in args if isinstance(arg, pd.DataFrame)), None)
+        fields = {'user': args[0]} if args and isinstance(args[0], str) else {}
+        with timed(stage, rows=rows, **fields):
+            return fn(*args, **kwargs)
+
+    return wrapper
+
+
+def collect():
+    """Start collecting this run's records; returns the list they go to."""
+    records = []
+    _records.set(records)
+    return records
+
+
+def summarize(records):
+    """One row per stage (and user): calls, total seconds, rows, rows/s, peak MB."""
+    # rows are summed over calls, so rows/s is the throughput of the stage
+    if not records:
+        return pd.DataFrame(columns=['stage', 'user', 'calls', 'seconds', 'rows', 'rows/s', 'peak MB'])
+
+    frame = pd.DataFrame(records)
+    for column in ('user', 'rows', 'peak_mb'):
+        if column not in frame:
+            frame[column] = None
+    frame['user'] = frame['user'].fillna('')
+    frame['rows'] = pd.to_numeric(frame['rows'])
+    table = frame.groupby(['stage', 'user'], sort=False).agg(
+        calls=('seconds', 'size'),
+        seconds=('seconds', 'sum'),
+        rows=('rows', lambda rows: rows.sum(min_count=1)),
+        peak_mb=('peak_mb', 'max'),
+    ).reset_index()
+    table['rows/s'] = (table['rows'] / table['seconds']).where(table['seconds'] > 0).round()
+    table = table.rename(columns={'peak_mb': 'peak MB'})
+    return table[['stage', 'user', 'calls', 'seconds', 'rows', 'rows/s', 'peak MB']].sort_values(
+        'seconds', ascending=False, ignore_index=True)
@@ -0,0 +1,89 @@
+import contextvars
+import multiprocessing
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+
+# where a task runs: threads for pandas/NumPy work that releases the GIL or
+# reads shared frames, processes for pure-Python CPU work on small,
+# picklable inputs (TextBlob scoring, WordCloud layout)
+THREAD = 'thread'
+PROCESS = 'process'
+
+# worker processes are never forked from the server: it runs many threads
+# (Streamlit's, the THREAD pool's), and a fork copies locks they may hold.
+# Like spawned workers, the fork server imports the main script (the
+# Streamlit app) as __mp_main__, so its top level must not start pools
+START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+
+class Scheduler:
+    """Runs independent analyses concurrently on shared worker pools.
+
+    run() takes named tasks and yields each result as soon as it is ready,
+    so the caller can render it while the others are still computing. The
+    pools are created on first use and live as long as the server process;
+    arguments of PROCESS tasks are pickled, so pass them aggregates (word
+    frequencies, distinct texts) rather than whole chat frames."""
+
+    def __init__(self, max_threads=None, max_processes=None):
+        cpus = os.cpu_count() or 1
+        self.max_threads = max_threads or min(32, cpus + 4)
+        self.max_processes = max_processes or cpus
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def _pool(self, kind):
+        with self._lock:
+            pool = self._pools.get(kind)
+            if pool is None:
+                if kind == THREAD:
+                    pool = ThreadPoolExecutor(self.max_threads, thread_name_prefix='analysis')
+                elif kind == PROCESS:
+                    pool = ProcessPoolExecutor(self.max_processes,
+                                               mp_context=multiprocessing.get_context(START_METHOD))
+                else:
+                    raise ValueError(f"Unknown task kind {kind!r}, expected {THREAD!r} or {PROCESS!r}")
+                self._pools[kind] = pool
+            return pool
+
+    def submit(self, kind, fn, *args):
+        if kind == THREAD:
+            # run with the submitter's context variables (e.g. the profiling
+            # records of the current dashboard run)
+            return self._pool(kind).submit(contextvars.copy_context().run, fn, *args)
+        return self._pool(kind).submit(fn, *args)
+
+    def call(self, kind, fn, *args):
+        """Run one task on a pool and wait for it (e.g. from a THREAD task)."""
+        return self.submit(kind, fn, *args).result()
+
+    def run(self, tasks):
+        """Yield (name, result) for `tasks` in completion order.
+
+        `tasks` maps a name to (kind, fn, *args). If a task fails, the tasks
+        not started yet are cancelled and its exception is raised."""
+        pending = {self.submit(kind, fn, *args): name for name, (kind, fn, *args) in tasks.items()}
+        try:
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = pending.pop(future)
+                    yield name, future.result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def shutdown(self):
+        with self._lock:
+            pools, self._pools = self._pools, {}
+        for pool in pools.values():
+            pool.shutdown(cancel_futures=True)
+
+
+# shared by all sessions; ANALYSIS_THREADS / ANALYSIS_PROCESSES cap the pools
+scheduler = Scheduler(
+    max_threads=int(os.environ.get('ANALYSIS_THREADS', 0)) or None,
+    max_processes=int(os.environ.get('ANALYSIS_PROCESSES', 0)) or None,
+)
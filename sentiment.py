@@ -0,0 +1,150 @@
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+import scheduler
+
+
+logger = logging.getLogger(__name__)
+
+# words that flip (and weaken) the polarity of the next word, as in TextBlob
+NEGATIONS = {'no', 'not', "n't", 'never'}
+
+
+def textblob_scores(texts):
+    """TextBlob (pattern) polarity, one text at a time."""
+    from textblob import TextBlob
+
+    scores = []
+    failures = 0
+    for text in texts:
+        try:
+            scores.append(TextBlob(text).sentiment.polarity)
+        except Exception:
+            failures += 1
+            scores.append(0.0)
+
+    if failures:
+        logger.warning("TextBlob failed on %d of %d messages, scored as neutral", failures, len(texts))
+    return scores
+
+
+_lexicon = None
+
+
+def _load_lexicon():
+    global _lexicon
+    if _lexicon is None:
+        from textblob.en import sentiment as pattern_sentiment
+
+        _lexicon = {word: senses[None][0] for word, senses in pattern_sentiment.items() if None in senses}
+    return _lexicon
+
+
+def lexicon_scores(texts):
+    """Vectorized approximation of TextBlob: mean lexicon polarity of the words.
+
+    All texts are tokenized and looked up at once (explode + map + groupby)
+    instead of building a TextBlob per message. Negations flip and halve the
+    next word like TextBlob does; intensifiers and emoticons are ignored."""
+    tokens = pd.Series(texts, dtype=object).str.lower().str.findall(r"[a-z]+(?:'[a-z]+)?|n't").explode()
+    polarity = tokens.map(_load_lexicon())
+
+    previous = tokens.shift()
+    same_message = tokens.index.to_series().shift().to_numpy() == tokens.index.to_numpy()
+    negated = previous.isin(NEGATIONS).to_numpy() & same_message
+    polarity = polarity.where(~negated, polarity * -0.5)
+
+    scores = polarity.groupby(level=0).mean()
+    return scores.reindex(range(len(texts))).fillna(0.0).tolist()
+
+
+BACKENDS = {
+    'textblob': textblob_scores,
+    'lexicon': lexicon_scores,
+}
+
+
+def register_backend(name, score_texts):
+    """Make a scorer available to SentimentEngine by name.
+
+    `score_texts` takes a list of strings and returns one polarity in
+    [-1, 1] per string. It must be a module-level function so batches can be
+    sent to worker processes."""
+    BACKENDS[name] = score_texts
+
+
+def _score_batch(args):
+    backend, texts = args
+    return BACKENDS[backend](texts)
+
+
+class SentimentEngine:
+    """Scores message polarity once per distinct text.
+
+    Texts are stripped and de-duplicated before scoring, and scores are
+    memoized in a bounded LRU shared by every call, so repeated messages
+    ("ok", "haha", ...) and reruns cost a lookup. Large sets of new texts are
+    split into batches and scored on the PROCESS pool of the shared
+    scheduler.scheduler; with processes=1 they are scored in the calling
+    process."""
+
+    def __init__(self, backend='textblob', cache_size=200_000, processes=None,
+                 batch_size=5_000, parallel_threshold=20_000):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown sentiment backend {backend!r}, expected one of {sorted(BACKENDS)}")
+        self.backend = backend
+        self.cache_size = cache_size
+        self.processes = processes or scheduler.scheduler.max_processes
+        self.batch_size = batch_size
+        self.parallel_threshold = parallel_threshold
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def score(self, texts):
+        """Return a float array with the polarity of each text."""
+        codes, uniques = pd.factorize(pd.Series(texts, dtype=object).str.strip())
+        uniques = list(uniques)
+
+        scores = np.empty(len(uniques))
+        missing = []
+        with self._lock:
+            for i, text in enumerate(uniques):
+                cached = self._cache.get(text)
+                if cached is None:
+                    missing.append(i)
+                else:
+                    self._cache.move_to_end(text)
+                    scores[i] = cached
+
+        if missing:
+            new_scores = self._score_uncached([uniques[i] for i in missing])
+            scores[missing] = new_scores
+            with self._lock:
+                for i, score in zip(missing, new_scores):
+                    self._cache[uniques[i]] = score
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        return scores[codes] if len(codes) else np.empty(0)
+
+    def _score_uncached(self, texts):
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        if self.processes > 1 and len(texts) >= self.parallel_threshold:
+            futures = [scheduler.scheduler.submit(scheduler.PROCESS, _score_batch, (self.backend, batch))
+                       for batch in batches]
+            return [score for future in futures for score in future.result()]
+
+        return [score for batch in batches for score in _score_batch((self.backend, batch))]
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+
+# shared by all sessions so memoized scores survive reruns
+engine = SentimentEngine(backend=os.environ.get('SENTIMENT_BACKEND', 'textblob'))